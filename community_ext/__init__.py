@@ -15,10 +15,14 @@ from .community_ext import (
     induced_graph,
     load_binary,
     estimate_gamma,
+    estimate_gamma_from_status,
     estimate_mu,
+    estimate_mu_from_status,
     ilfr_mu_loglikelihood,
     compare_partitions,
-    model_log_likelihood
+    model_log_likelihood,
+    model_log_likelihood_from_status,
+    model_log_likelihood_delta
 )
 
 
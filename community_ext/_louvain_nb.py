@@ -0,0 +1,791 @@
+# -*- coding: utf-8 -*-
+"""
+Compiled local moving sweeps of the Louvain algorithm, one per model.
+
+Each one_level_* function performs one pass over the nodes of a level,
+moving every node to the neighbouring community with the best likelihood
+increase. The increase of every candidate is computed by the _best_*
+function of the model directly from the degrees of the communities, as if
+the node had been removed from its own one, and only an actual move
+modifies the status. The graph is given in CSR form (indptr, indices,
+data) and the status as the NumPy arrays of community_status.Status, which
+are updated in place. The functions return True if at least one node has
+moved, and mark the neighbours of the moved nodes in the dirty array, so
+that the next pass may be restricted to them.
+
+The parallel_level_* functions are the parallel counterparts: the nodes
+of each class of a greedy coloring are not adjacent, so their best moves
+are evaluated concurrently on the status at the start of the class and
+then applied one by one. The moves of a class do not see each other's
+effect on the community degrees, so the partitions differ from the ones of
+the sequential passes, and with randomize they also depend on the thread
+scheduling.
+
+The functions are compiled with numba when it is available and run as
+plain python otherwise.
+"""
+import random
+from math import log
+
+import numpy as np
+
+try:
+    from numba import njit, prange
+    _NUMBA = True
+except ImportError:
+    _NUMBA = False
+    prange = range
+
+    def njit(*args, **kwargs):
+        """Used instead of numba.njit when numba is not installed"""
+        if len(args) == 1 and callable(args[0]):
+            return args[0]
+        return lambda func: func
+
+__author__ = """Aleksey Tikhonov (altsoph@gmail.com)"""
+__author__ = """Liudmila Ostroumova Prokhorenkova (ostroumova-la@yandex-team.ru)"""
+#    Copyright (C) 2018 by
+#    Aleksey Tikhonov (altsoph@gmail.com>
+#    Liudmila Ostroumova Prokhorenkova (ostroumova-la@yandex-team.ru)
+#    All rights reserved.
+#    BSD license.
+
+_MIN = 0.0000001
+
+
+@njit(cache=True)
+def _scratch(indptr):
+    """
+    Allocate the scratch hash table used by _neighcom, sized for the
+    largest neighbourhood of the graph, so it is allocated once per pass
+    """
+    max_degree = 1
+    for node in range(indptr.shape[0] - 1):
+        max_degree = max(max_degree, indptr[node + 1] - indptr[node])
+    return _new_scratch(max_degree)
+
+
+@njit(cache=True)
+def _new_scratch(max_degree):
+    """Allocate a scratch hash table for up to max_degree communities"""
+    max_degree = max(max_degree, 1)
+    size = 1
+    while size < 2 * max_degree:
+        size *= 2
+    table = np.full(size, -1, np.int64)
+    slots = np.empty(max_degree, np.int64)
+    coms = np.empty(max_degree, np.int64)
+    weights = np.empty(max_degree, np.float64)
+    return table, slots, coms, weights
+
+
+@njit(cache=True)
+def _neighcom(node, indptr, indices, data, node2com, table, slots, coms,
+              weights):
+    """
+    Compute the communities in the neighborhood of node and the weights of
+    the links towards them into the scratch arrays, using linear probing on
+    community ids. Return the number of communities found
+    """
+    mask = table.shape[0] - 1
+    count = 0
+    for idx in range(indptr[node], indptr[node + 1]):
+        neighbor = indices[idx]
+        if neighbor == node:
+            continue
+        com = node2com[neighbor]
+        slot = com & mask
+        pos = table[slot]
+        while pos != -1 and coms[pos] != com:
+            slot = (slot + 1) & mask
+            pos = table[slot]
+        if pos == -1:
+            pos = count
+            table[slot] = pos
+            slots[pos] = slot
+            coms[pos] = com
+            weights[pos] = 0.
+            count += 1
+        weights[pos] += data[idx]
+    return count
+
+
+@njit(cache=True)
+def _weight_to(com, table, coms, weights):
+    """Weight of the links towards community com, 0. if there are none"""
+    mask = table.shape[0] - 1
+    slot = com & mask
+    pos = table[slot]
+    while pos != -1:
+        if coms[pos] == com:
+            return weights[pos]
+        slot = (slot + 1) & mask
+        pos = table[slot]
+    return 0.
+
+
+@njit(cache=True)
+def _clear(table, slots, count):
+    """Reset the slots of the scratch hash table used by the last node"""
+    for pos in range(count):
+        table[slots[pos]] = -1
+
+
+if _NUMBA:
+    @njit(cache=True)
+    def seed_random(seed):
+        """
+        Seed the generator of the random evaluation orders. Compiled code
+        draws from a generator of its own, which random.seed and
+        np.random.seed do not reach, so the callers seed it from the random
+        module
+        """
+        np.random.seed(seed)
+
+    @njit(cache=True)
+    def _shuffle(order):
+        """Shuffle order in place with the generator of compiled code"""
+        np.random.shuffle(order)
+else:
+    # without numba the random module is used directly, so there is nothing
+    # to seed and the global NumPy generator of the caller is left alone
+    seed_random = None
+
+    def _shuffle(order):
+        """Shuffle order in place with the random module"""
+        random.shuffle(order)
+
+
+@njit(cache=True)
+def _candidates(coms, randomize):
+    """Evaluation order of the neighbour communities"""
+    if randomize:
+        order = np.arange(coms.shape[0])
+        _shuffle(order)
+        return order
+    return np.argsort(coms)
+
+
+@njit(cache=True)
+def _candidates_by_weight(weights, randomize):
+    """
+    Evaluation order of the neighbour communities by decreasing weight of
+    the links towards them, equal weights in random order if randomize
+    """
+    if randomize:
+        order = np.arange(weights.shape[0])
+        _shuffle(order)
+        return order[np.argsort(-weights[order], kind='mergesort')]
+    return np.argsort(-weights, kind='mergesort')
+
+
+@njit(cache=True)
+def _log_degree(degree):
+    """log of a community degree, -inf for an empty community"""
+    if degree > 0.:
+        return log(degree)
+    return -np.inf
+
+
+@njit(cache=True)
+def _log_ilfr_term(degree, mpar, par2E):
+    """log((mpar / degree) + par2E), 0. for an empty community"""
+    if degree > 0.:
+        return log((mpar / degree) + par2E)
+    return 0.
+
+
+@njit(cache=True)
+def _mark_neighbors(node, indptr, indices, dirty):
+    """Mark the neighbours of a node which has moved as dirty"""
+    for idx in range(indptr[node], indptr[node + 1]):
+        dirty[indices[idx]] = True
+
+
+@njit(cache=True)
+def _move(node, com_node, com, weight_node, weight, node2com, degrees,
+          gdegrees, internals, com2size, node2size, loops):
+    """
+    Move node from com_node, to which it is linked by weight_node, into com,
+    to which it is linked by weight, and modify status
+    """
+    v_degree = gdegrees[node]
+    v_loops = loops[node]
+    v_size = node2size[node]
+    degrees[com_node] -= v_degree
+    internals[com_node] = internals[com_node] - weight_node - v_loops
+    com2size[com_node] -= v_size
+    node2com[node] = com
+    degrees[com] += v_degree
+    internals[com] = internals[com] + weight + v_loops
+    com2size[com] += v_size
+
+
+@njit(cache=True)
+def _best_dcppm(node, com_node, coms, weights, v_in_degree, degrees,
+                gdegrees, par, __2E, randomize):
+    """
+    Best community for node under 'dcppm', evaluated as if node had been
+    removed from com_node, without modifying the status
+    """
+    com_degree = degrees[com_node]
+    v_degree = gdegrees[node]
+    pre_calc1 = par * v_degree / __2E
+    remove_cost = pre_calc1 * (com_degree - v_degree) - v_in_degree
+    best_com = com_node
+    best_increase = 0.
+    best_weight = v_in_degree
+    # add_cost never exceeds dnc, so with the candidates sorted by
+    # decreasing dnc the scan stops once this bound falls below the best
+    # increase; ties go to the lowest community id, as in a scan by id
+    for pos in _candidates_by_weight(weights, randomize):
+        com = coms[pos]
+        dnc = weights[pos]
+        if dnc + remove_cost < best_increase:
+            break
+        com_degree = degrees[com]
+        if com == com_node:
+            com_degree = com_degree - v_degree
+        add_cost = dnc - pre_calc1 * com_degree
+        incr = add_cost + remove_cost
+        if incr > best_increase or (not randomize and best_increase > 0.
+                                    and incr == best_increase
+                                    and com < best_com):
+            best_increase = incr
+            best_com = com
+            best_weight = dnc
+    return best_com, best_weight
+
+
+@njit(cache=True)
+def _best_ppm(node, com_node, coms, weights, v_in_degree, com2size,
+              node2size, par, __E, P2, randomize):
+    """
+    Best community for node under 'ppm', evaluated as if node had been
+    removed from com_node, without modifying the status
+    """
+    volume_node = node2size[node]
+    volume_cluster = com2size[com_node] - volume_node
+    pre_calc1 = par * volume_node / P2
+    remove_cost = volume_cluster * pre_calc1 - v_in_degree / __E
+    best_com = com_node
+    best_increase = 0.
+    best_weight = v_in_degree
+    # add_cost never exceeds dnc / __E, so with the candidates sorted by
+    # decreasing dnc the scan stops once this bound falls below the best
+    # increase; ties go to the lowest community id, as in a scan by id
+    for pos in _candidates_by_weight(weights, randomize):
+        com = coms[pos]
+        dnc = weights[pos]
+        if dnc / __E + remove_cost < best_increase:
+            break
+        volume_cluster = com2size[com]
+        if com == com_node:
+            volume_cluster -= volume_node
+        add_cost = dnc / __E - volume_cluster * pre_calc1
+        incr = add_cost + remove_cost
+        if incr > best_increase or (not randomize and best_increase > 0.
+                                    and incr == best_increase
+                                    and com < best_com):
+            best_increase = incr
+            best_com = com
+            best_weight = dnc
+    return best_com, best_weight
+
+
+@njit(cache=True)
+def _ilfrs_constants(par, total_weight):
+    """Precomputed logarithms of the 'ilfrs' costs"""
+    __2E = 2. * total_weight
+    mpar = 1. - par
+    __l2E = 0.
+    __l2Epar = 0.
+    __l2Epar2 = 0.
+    if total_weight > 0:
+        __l2E = log(__2E)
+        if mpar > 0.:
+            __l2Epar = log(__2E * mpar / par)
+    if mpar > 0.:
+        __l2Epar2 = (log(par / mpar) - __l2E)
+    return __l2Epar, __l2Epar2
+
+
+@njit(cache=True)
+def _best_ilfrs(node, com_node, coms, weights, v_in_degree, degrees,
+                gdegrees, internals, loops, log_deg, __l2Epar, __l2Epar2,
+                randomize):
+    """
+    Best community for node under 'ilfrs', evaluated as if node had been
+    removed from com_node, without modifying the status
+    """
+    com_degree = degrees[com_node]
+    v_degree = gdegrees[node]
+    v_loops = loops[node]
+    com_in_degree = internals[com_node]
+    remove_cost = v_in_degree * __l2Epar2
+    if com_degree > 0.:
+        remove_cost += com_in_degree * log_deg[com_node]
+    else:
+        remove_cost += com_in_degree / _MIN
+    if com_degree > v_degree:
+        remove_cost -= ((com_in_degree - v_loops - v_in_degree) *
+                        log(com_degree - v_degree))
+    best_com = com_node
+    best_increase = 0.
+    best_weight = v_in_degree
+    for pos in _candidates(coms, randomize):
+        com = coms[pos]
+        dnc = weights[pos]
+        com_in_degree = internals[com]
+        com_degree = degrees[com]
+        log_com_degree = log_deg[com]
+        if com == com_node:
+            com_in_degree = com_in_degree - v_in_degree - v_loops
+            com_degree = com_degree - v_degree
+            log_com_degree = _log_degree(com_degree)
+        add_cost = dnc * __l2Epar
+        add_cost += com_in_degree * log_com_degree
+        add_cost -= ((com_in_degree + v_loops + dnc) *
+                     log(com_degree + v_degree))
+        incr = add_cost + remove_cost
+        if incr > best_increase:
+            best_increase = incr
+            best_com = com
+            best_weight = dnc
+    return best_com, best_weight
+
+
+@njit(cache=True)
+def _ilfr_constants(par, total_weight):
+    """Precomputed terms of the 'ilfr' costs"""
+    __2E = 2. * total_weight
+    __l2E = 0.
+    if total_weight > 0:
+        __l2E = log(__2E)
+    __lpar = log(par)
+    return 1. - par, par / __2E, __l2E, __lpar, (__lpar - __l2E)
+
+
+@njit(cache=True)
+def _best_ilfr(node, com_node, coms, weights, v_in_degree, degrees,
+               gdegrees, internals, loops, log_ilfr, mpar, __par2E, __l2E,
+               __lpar, __l2Epar3, randomize):
+    """
+    Best community for node under 'ilfr', evaluated as if node had been
+    removed from com_node, without modifying the status
+    """
+    com_degree = degrees[com_node]
+    v_degree = gdegrees[node]
+    v_loops = loops[node]
+    com_in_degree = internals[com_node]
+    remove_cost = v_in_degree * __l2Epar3
+    if com_degree > 0:
+        remove_cost -= com_in_degree * log_ilfr[com_node]
+    if com_degree - v_degree > 0:
+        remove_cost += ((com_in_degree - v_in_degree - v_loops) *
+                        log((mpar / (com_degree - v_degree)) + __par2E))
+    best_com = com_node
+    best_increase = 0.
+    best_weight = v_in_degree
+    for pos in _candidates(coms, randomize):
+        com = coms[pos]
+        dnc = weights[pos]
+        com_in_degree = internals[com]
+        com_degree = degrees[com]
+        log_term = log_ilfr[com]
+        if com == com_node:
+            com_in_degree = com_in_degree - v_in_degree - v_loops
+            com_degree = com_degree - v_degree
+            log_term = _log_ilfr_term(com_degree, mpar, __par2E)
+        add_cost = dnc * (__l2E - __lpar)
+        if com_degree > 0:
+            add_cost -= com_in_degree * log_term
+        if com_degree + v_degree > 0:
+            add_cost += ((com_in_degree + dnc + v_loops) *
+                         log((mpar / (com_degree + v_degree)) + __par2E))
+        incr = add_cost + remove_cost
+        if incr > best_increase:
+            best_increase = incr
+            best_com = com
+            best_weight = dnc
+    return best_com, best_weight
+
+
+@njit(cache=True)
+def one_level_dcppm(indptr, indices, data, order, randomize, node2com,
+                    degrees, gdegrees, internals, com2size, node2size, loops,
+                    par, total_weight, P2, dirty):
+    """One local moving pass for the 'dcppm' model"""
+    __2E = 2. * total_weight
+    table, slots, coms, weights = _scratch(indptr)
+    modified = False
+    for node in order:
+        com_node = node2com[node]
+        count = _neighcom(node, indptr, indices, data, node2com, table, slots,
+                          coms, weights)
+        v_in_degree = _weight_to(com_node, table, coms, weights)
+        best_com, best_weight = _best_dcppm(node, com_node, coms[:count],
+                                            weights[:count], v_in_degree,
+                                            degrees, gdegrees, par, __2E,
+                                            randomize)
+        _clear(table, slots, count)
+        if best_com != com_node:
+            _move(node, com_node, best_com, v_in_degree, best_weight,
+                  node2com, degrees, gdegrees, internals, com2size, node2size,
+                  loops)
+            _mark_neighbors(node, indptr, indices, dirty)
+            modified = True
+    return modified
+
+
+@njit(cache=True)
+def one_level_ppm(indptr, indices, data, order, randomize, node2com,
+                  degrees, gdegrees, internals, com2size, node2size, loops,
+                  par, total_weight, P2, dirty):
+    """One local moving pass for the 'ppm' model"""
+    table, slots, coms, weights = _scratch(indptr)
+    modified = False
+    for node in order:
+        com_node = node2com[node]
+        count = _neighcom(node, indptr, indices, data, node2com, table, slots,
+                          coms, weights)
+        v_in_degree = _weight_to(com_node, table, coms, weights)
+        best_com, best_weight = _best_ppm(node, com_node, coms[:count],
+                                          weights[:count], v_in_degree,
+                                          com2size, node2size, par,
+                                          total_weight, P2, randomize)
+        _clear(table, slots, count)
+        if best_com != com_node:
+            _move(node, com_node, best_com, v_in_degree, best_weight,
+                  node2com, degrees, gdegrees, internals, com2size, node2size,
+                  loops)
+            _mark_neighbors(node, indptr, indices, dirty)
+            modified = True
+    return modified
+
+
+@njit(cache=True)
+def one_level_ilfrs(indptr, indices, data, order, randomize, node2com,
+                    degrees, gdegrees, internals, com2size, node2size, loops,
+                    par, total_weight, P2, dirty):
+    """One local moving pass for the 'ilfrs' model"""
+    __l2Epar, __l2Epar2 = _ilfrs_constants(par, total_weight)
+    # log(degree) of every community, refreshed whenever a degree changes
+    log_deg = np.empty(degrees.shape[0], np.float64)
+    for com in range(degrees.shape[0]):
+        log_deg[com] = _log_degree(degrees[com])
+    table, slots, coms, weights = _scratch(indptr)
+    modified = False
+    for node in order:
+        com_node = node2com[node]
+        count = _neighcom(node, indptr, indices, data, node2com, table, slots,
+                          coms, weights)
+        v_in_degree = _weight_to(com_node, table, coms, weights)
+        best_com, best_weight = _best_ilfrs(node, com_node, coms[:count],
+                                            weights[:count], v_in_degree,
+                                            degrees, gdegrees, internals,
+                                            loops, log_deg, __l2Epar,
+                                            __l2Epar2, randomize)
+        _clear(table, slots, count)
+        if best_com != com_node:
+            _move(node, com_node, best_com, v_in_degree, best_weight,
+                  node2com, degrees, gdegrees, internals, com2size, node2size,
+                  loops)
+            _mark_neighbors(node, indptr, indices, dirty)
+            log_deg[com_node] = _log_degree(degrees[com_node])
+            log_deg[best_com] = _log_degree(degrees[best_com])
+            modified = True
+    return modified
+
+
+@njit(cache=True)
+def one_level_ilfr(indptr, indices, data, order, randomize, node2com,
+                   degrees, gdegrees, internals, com2size, node2size, loops,
+                   par, total_weight, P2, dirty):
+    """One local moving pass for the 'ilfr' model"""
+    mpar, __par2E, __l2E, __lpar, __l2Epar3 = _ilfr_constants(par,
+                                                              total_weight)
+    # log((mpar / degree) + __par2E) of every community, refreshed whenever
+    # a degree changes
+    log_ilfr = np.empty(degrees.shape[0], np.float64)
+    for com in range(degrees.shape[0]):
+        log_ilfr[com] = _log_ilfr_term(degrees[com], mpar, __par2E)
+    table, slots, coms, weights = _scratch(indptr)
+    modified = False
+    for node in order:
+        com_node = node2com[node]
+        count = _neighcom(node, indptr, indices, data, node2com, table, slots,
+                          coms, weights)
+        v_in_degree = _weight_to(com_node, table, coms, weights)
+        best_com, best_weight = _best_ilfr(node, com_node, coms[:count],
+                                           weights[:count], v_in_degree,
+                                           degrees, gdegrees, internals,
+                                           loops, log_ilfr, mpar, __par2E,
+                                           __l2E, __lpar, __l2Epar3,
+                                           randomize)
+        _clear(table, slots, count)
+        if best_com != com_node:
+            _move(node, com_node, best_com, v_in_degree, best_weight,
+                  node2com, degrees, gdegrees, internals, com2size, node2size,
+                  loops)
+            _mark_neighbors(node, indptr, indices, dirty)
+            log_ilfr[com_node] = _log_ilfr_term(degrees[com_node], mpar,
+                                                __par2E)
+            log_ilfr[best_com] = _log_ilfr_term(degrees[best_com], mpar,
+                                                __par2E)
+            modified = True
+    return modified
+
+
+@njit(cache=True)
+def greedy_coloring(indptr, indices):
+    """Color the nodes greedily so that adjacent nodes never share a color"""
+    size = indptr.shape[0] - 1
+    colors = np.full(size, -1, np.int64)
+    # used[color] == node when a neighbour of node already has this color
+    used = np.full(size + 1, -1, np.int64)
+    for node in range(size):
+        for idx in range(indptr[node], indptr[node + 1]):
+            neighbor = indices[idx]
+            if neighbor != node and colors[neighbor] >= 0:
+                used[colors[neighbor]] = node
+        color = 0
+        while used[color] == node:
+            color += 1
+        colors[node] = color
+    return colors
+
+
+@njit(cache=True)
+def _color_classes(order, colors):
+    """
+    Group the nodes of order by color, keeping their relative order.
+    Return the grouped nodes and the bounds of each class
+    """
+    grouped = order[np.argsort(colors[order], kind='mergesort')]
+    bounds = np.flatnonzero(np.diff(colors[grouped])) + 1
+    starts = np.concatenate((np.zeros(1, np.int64), bounds))
+    ends = np.concatenate((bounds, np.full(1, grouped.shape[0], np.int64)))
+    return grouped, starts, ends
+
+
+@njit(cache=True)
+def _commit(nodes, indptr, indices, best_coms, best_weights, in_weights,
+            node2com, degrees, gdegrees, internals, com2size, node2size,
+            loops, dirty):
+    """Apply the moves proposed for a color class, return True if any"""
+    modified = False
+    for idx in range(nodes.shape[0]):
+        node = nodes[idx]
+        com_node = node2com[node]
+        if best_coms[idx] != com_node:
+            _move(node, com_node, best_coms[idx], in_weights[idx],
+                  best_weights[idx], node2com, degrees, gdegrees, internals,
+                  com2size, node2size, loops)
+            _mark_neighbors(node, indptr, indices, dirty)
+            modified = True
+    return modified
+
+
+@njit(parallel=True, cache=True)
+def _propose_dcppm(nodes, indptr, indices, data, randomize, node2com,
+                   degrees, gdegrees, par, __2E, best_coms, best_weights,
+                   in_weights):
+    """Evaluate the best 'dcppm' moves of a color class in parallel"""
+    for idx in prange(nodes.shape[0]):
+        node = nodes[idx]
+        com_node = node2com[node]
+        table, slots, coms, weights = _new_scratch(indptr[node + 1] -
+                                                   indptr[node])
+        count = _neighcom(node, indptr, indices, data, node2com, table, slots,
+                          coms, weights)
+        v_in_degree = _weight_to(com_node, table, coms, weights)
+        best_com, best_weight = _best_dcppm(node, com_node, coms[:count],
+                                            weights[:count], v_in_degree,
+                                            degrees, gdegrees, par, __2E,
+                                            randomize)
+        best_coms[idx] = best_com
+        best_weights[idx] = best_weight
+        in_weights[idx] = v_in_degree
+
+
+@njit(cache=True)
+def parallel_level_dcppm(colors, indptr, indices, data, order, randomize,
+                         node2com, degrees, gdegrees, internals, com2size,
+                         node2size, loops, par, total_weight, P2, dirty):
+    """One local moving pass for the 'dcppm' model, by color classes"""
+    __2E = 2. * total_weight
+    grouped, starts, ends = _color_classes(order, colors)
+    best_coms = np.empty(grouped.shape[0], np.int64)
+    best_weights = np.empty(grouped.shape[0], np.float64)
+    in_weights = np.empty(grouped.shape[0], np.float64)
+    modified = False
+    for cls in range(starts.shape[0]):
+        nodes = grouped[starts[cls]:ends[cls]]
+        _propose_dcppm(nodes, indptr, indices, data, randomize, node2com,
+                       degrees, gdegrees, par, __2E, best_coms, best_weights,
+                       in_weights)
+        if _commit(nodes, indptr, indices, best_coms, best_weights,
+                   in_weights, node2com, degrees, gdegrees, internals,
+                   com2size, node2size, loops, dirty):
+            modified = True
+    return modified
+
+
+@njit(parallel=True, cache=True)
+def _propose_ppm(nodes, indptr, indices, data, randomize, node2com,
+                 com2size, node2size, par, __E, P2, best_coms, best_weights,
+                 in_weights):
+    """Evaluate the best 'ppm' moves of a color class in parallel"""
+    for idx in prange(nodes.shape[0]):
+        node = nodes[idx]
+        com_node = node2com[node]
+        table, slots, coms, weights = _new_scratch(indptr[node + 1] -
+                                                   indptr[node])
+        count = _neighcom(node, indptr, indices, data, node2com, table, slots,
+                          coms, weights)
+        v_in_degree = _weight_to(com_node, table, coms, weights)
+        best_com, best_weight = _best_ppm(node, com_node, coms[:count],
+                                          weights[:count], v_in_degree,
+                                          com2size, node2size, par, __E, P2,
+                                          randomize)
+        best_coms[idx] = best_com
+        best_weights[idx] = best_weight
+        in_weights[idx] = v_in_degree
+
+
+@njit(cache=True)
+def parallel_level_ppm(colors, indptr, indices, data, order, randomize,
+                       node2com, degrees, gdegrees, internals, com2size,
+                       node2size, loops, par, total_weight, P2, dirty):
+    """One local moving pass for the 'ppm' model, by color classes"""
+    grouped, starts, ends = _color_classes(order, colors)
+    best_coms = np.empty(grouped.shape[0], np.int64)
+    best_weights = np.empty(grouped.shape[0], np.float64)
+    in_weights = np.empty(grouped.shape[0], np.float64)
+    modified = False
+    for cls in range(starts.shape[0]):
+        nodes = grouped[starts[cls]:ends[cls]]
+        _propose_ppm(nodes, indptr, indices, data, randomize, node2com,
+                     com2size, node2size, par, total_weight, P2, best_coms,
+                     best_weights, in_weights)
+        if _commit(nodes, indptr, indices, best_coms, best_weights,
+                   in_weights, node2com, degrees, gdegrees, internals,
+                   com2size, node2size, loops, dirty):
+            modified = True
+    return modified
+
+
+@njit(parallel=True, cache=True)
+def _propose_ilfrs(nodes, indptr, indices, data, randomize, node2com,
+                   degrees, gdegrees, internals, loops, log_deg, __l2Epar,
+                   __l2Epar2, best_coms, best_weights, in_weights):
+    """Evaluate the best 'ilfrs' moves of a color class in parallel"""
+    for idx in prange(nodes.shape[0]):
+        node = nodes[idx]
+        com_node = node2com[node]
+        table, slots, coms, weights = _new_scratch(indptr[node + 1] -
+                                                   indptr[node])
+        count = _neighcom(node, indptr, indices, data, node2com, table, slots,
+                          coms, weights)
+        v_in_degree = _weight_to(com_node, table, coms, weights)
+        best_com, best_weight = _best_ilfrs(node, com_node, coms[:count],
+                                            weights[:count], v_in_degree,
+                                            degrees, gdegrees, internals,
+                                            loops, log_deg, __l2Epar,
+                                            __l2Epar2, randomize)
+        best_coms[idx] = best_com
+        best_weights[idx] = best_weight
+        in_weights[idx] = v_in_degree
+
+
+@njit(cache=True)
+def parallel_level_ilfrs(colors, indptr, indices, data, order, randomize,
+                         node2com, degrees, gdegrees, internals, com2size,
+                         node2size, loops, par, total_weight, P2, dirty):
+    """One local moving pass for the 'ilfrs' model, by color classes"""
+    __l2Epar, __l2Epar2 = _ilfrs_constants(par, total_weight)
+    log_deg = np.empty(degrees.shape[0], np.float64)
+    for com in range(degrees.shape[0]):
+        log_deg[com] = _log_degree(degrees[com])
+    grouped, starts, ends = _color_classes(order, colors)
+    best_coms = np.empty(grouped.shape[0], np.int64)
+    best_weights = np.empty(grouped.shape[0], np.float64)
+    in_weights = np.empty(grouped.shape[0], np.float64)
+    modified = False
+    for cls in range(starts.shape[0]):
+        nodes = grouped[starts[cls]:ends[cls]]
+        _propose_ilfrs(nodes, indptr, indices, data, randomize, node2com,
+                       degrees, gdegrees, internals, loops, log_deg,
+                       __l2Epar, __l2Epar2, best_coms, best_weights,
+                       in_weights)
+        old_coms = node2com[nodes]
+        if _commit(nodes, indptr, indices, best_coms, best_weights,
+                   in_weights, node2com, degrees, gdegrees, internals,
+                   com2size, node2size, loops, dirty):
+            modified = True
+            for idx in range(nodes.shape[0]):
+                com = old_coms[idx]
+                log_deg[com] = _log_degree(degrees[com])
+                com = best_coms[idx]
+                log_deg[com] = _log_degree(degrees[com])
+    return modified
+
+
+@njit(parallel=True, cache=True)
+def _propose_ilfr(nodes, indptr, indices, data, randomize, node2com,
+                  degrees, gdegrees, internals, loops, log_ilfr, mpar,
+                  __par2E, __l2E, __lpar, __l2Epar3, best_coms, best_weights,
+                  in_weights):
+    """Evaluate the best 'ilfr' moves of a color class in parallel"""
+    for idx in prange(nodes.shape[0]):
+        node = nodes[idx]
+        com_node = node2com[node]
+        table, slots, coms, weights = _new_scratch(indptr[node + 1] -
+                                                   indptr[node])
+        count = _neighcom(node, indptr, indices, data, node2com, table, slots,
+                          coms, weights)
+        v_in_degree = _weight_to(com_node, table, coms, weights)
+        best_com, best_weight = _best_ilfr(node, com_node, coms[:count],
+                                           weights[:count], v_in_degree,
+                                           degrees, gdegrees, internals,
+                                           loops, log_ilfr, mpar, __par2E,
+                                           __l2E, __lpar, __l2Epar3,
+                                           randomize)
+        best_coms[idx] = best_com
+        best_weights[idx] = best_weight
+        in_weights[idx] = v_in_degree
+
+
+@njit(cache=True)
+def parallel_level_ilfr(colors, indptr, indices, data, order, randomize,
+                        node2com, degrees, gdegrees, internals, com2size,
+                        node2size, loops, par, total_weight, P2, dirty):
+    """One local moving pass for the 'ilfr' model, by color classes"""
+    mpar, __par2E, __l2E, __lpar, __l2Epar3 = _ilfr_constants(par,
+                                                              total_weight)
+    log_ilfr = np.empty(degrees.shape[0], np.float64)
+    for com in range(degrees.shape[0]):
+        log_ilfr[com] = _log_ilfr_term(degrees[com], mpar, __par2E)
+    grouped, starts, ends = _color_classes(order, colors)
+    best_coms = np.empty(grouped.shape[0], np.int64)
+    best_weights = np.empty(grouped.shape[0], np.float64)
+    in_weights = np.empty(grouped.shape[0], np.float64)
+    modified = False
+    for cls in range(starts.shape[0]):
+        nodes = grouped[starts[cls]:ends[cls]]
+        _propose_ilfr(nodes, indptr, indices, data, randomize, node2com,
+                      degrees, gdegrees, internals, loops, log_ilfr, mpar,
+                      __par2E, __l2E, __lpar, __l2Epar3, best_coms,
+                      best_weights, in_weights)
+        old_coms = node2com[nodes]
+        if _commit(nodes, indptr, indices, best_coms, best_weights,
+                   in_weights, node2com, degrees, gdegrees, internals,
+                   com2size, node2size, loops, dirty):
+            modified = True
+            for idx in range(nodes.shape[0]):
+                com = old_coms[idx]
+                log_ilfr[com] = _log_ilfr_term(degrees[com], mpar, __par2E)
+                com = best_coms[idx]
+                log_ilfr[com] = _log_ilfr_term(degrees[com], mpar, __par2E)
+    return modified
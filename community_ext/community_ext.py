@@ -7,15 +7,34 @@ Originally based on community aka python-louvain library from Thomas Aynaud
 """
 from __future__ import print_function
 
-import array
 import random
-from math import exp, log, sqrt
-from collections import defaultdict
-from collections import Counter
+from math import log, sqrt
+from functools import partial
 
 import networkx as nx
-
-from .community_status import Status
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.csgraph import reverse_cuthill_mckee
+from scipy.special import xlogy
+
+try:
+    from sklearn.metrics import mutual_info_score
+except ImportError:
+    mutual_info_score = None
+
+from .community_status import Status, _sorted_nodes
+from ._louvain_nb import (
+    greedy_coloring,
+    seed_random,
+    one_level_dcppm,
+    one_level_ppm,
+    one_level_ilfr,
+    one_level_ilfrs,
+    parallel_level_dcppm,
+    parallel_level_ppm,
+    parallel_level_ilfr,
+    parallel_level_ilfrs
+)
 
 __author__ = """Aleksey Tikhonov (altsoph@gmail.com)"""
 __author__ = """Liudmila Ostroumova Prokhorenkova (ostroumova-la@yandex-team.ru)"""
@@ -69,9 +88,16 @@ def partition_at_level(dendrogram, level):
     >>>     print("partition at level", level, "is", partition_at_level(dendrogram, level))  # NOQA
     """
     partition = dendrogram[0].copy()
-    for index in range(1, level + 1):
-        for node, community in partition.items():
-            partition[node] = dendrogram[index][community]
+    if level == 0:
+        return partition
+    # compose the upper levels, which only hold communities, top down and
+    # then map every node once
+    mapping = dendrogram[level]
+    for index in range(level - 1, 0, -1):
+        mapping = dict((com, mapping[upper])
+                       for com, upper in dendrogram[index].items())
+    for node, community in partition.items():
+        partition[node] = mapping[community]
     return partition
 
 
@@ -118,32 +144,30 @@ def modularity(partition, graph, weight='weight',gamma = 1.):
     if graph.is_directed():
         raise TypeError("Bad graph type, use only non directed graph")
 
-    inc = dict([])
-    deg = dict([])
     links = graph.size(weight=weight)
     if links == 0:
         raise ValueError("A graph without link has an undefined modularity")
 
-    for node in graph:
-        com = partition[node]
-        deg[com] = deg.get(com, 0.) + graph.degree(node, weight=weight)
-        for neighbor, datas in graph[node].items():
-            edge_weight = datas.get(weight, 1)
-            if partition[neighbor] == com:
-                if neighbor == node:
-                    inc[com] = inc.get(com, 0.) + float(edge_weight)
-                else:
-                    inc[com] = inc.get(com, 0.) + float(edge_weight) / 2.
+    nodes = list(graph)
+    com, _ = __factorize((partition[node] for node in nodes), len(nodes))
+    adjacency = nx.to_scipy_sparse_array(graph, nodelist=nodes, weight=weight,
+                                         dtype=np.float64, format='coo')
+    # off-diagonal entries are stored twice, self-loops once on the diagonal
+    loops = adjacency.diagonal()
+    deg = np.bincount(com, weights=np.asarray(adjacency.sum(axis=1)).ravel()
+                      + loops)
+    intra = com[adjacency.row] == com[adjacency.col]
+    inc = (np.bincount(com[adjacency.row[intra]],
+                       weights=adjacency.data[intra], minlength=len(deg))
+           + np.bincount(com, weights=loops)) / 2.
 
-    res = 0.
-    for com in set(partition.values()):
-        res += (inc.get(com, 0.) / links) - \
-               gamma * (deg.get(com, 0.) / (2. * links)) ** 2
-    return res
+    return float((inc / links).sum() -
+                 gamma * ((deg / (2. * links)) ** 2).sum())
 
 
 def best_partition(graph, model=None, partition=None,
-                   weight='weight', resolution=1., randomize=False, pars = None):
+                   weight='weight', resolution=1., randomize=False, pars = None,
+                   parallel=False, prune=False, return_status=False):
     assert model in ('dcppm','ppm','ilfr','ilfrs'), "Unknown model specified"
     """Compute the partition of the graph nodes which maximises the modularity
     (or try..) using the Louvain heuristices
@@ -169,18 +193,37 @@ def best_partition(graph, model=None, partition=None,
         R. Lambiotte, J.-C. Delvenne, M. Barahona
     randomize :  boolean, optional
         Will randomize the node evaluation order and the community evaluation
-        order to get different partitions at each call
+        order to get different partitions at each call, both drawn from the
+        random module (random.seed makes them reproducible)
     pars : dict, optional
        the dict with 'mu' or 'gamma' key and a float value.
        Use 'mu' within (0,1) for 'ilfr' and 'ilfrs' models and
        'gamma' within (0,inf) for 'ppm' and 'dcppm' models.
        Also, for 'ppm' model it's possible to use two optional parameters, 
        fixedPin and fixedPout, they could be used to modify the gamma calculation.
+    parallel : boolean, optional
+        Will evaluate the moves of non adjacent nodes in parallel threads
+        (needs numba). The moves of a batch are chosen on the same status,
+        so the partitions differ from the sequential ones. Default to False
+    prune : boolean, optional
+        After the first pass of a level, will only reconsider the nodes with
+        a neighbour moved during the previous pass. Faster on large graphs,
+        but the partitions may differ slightly. Default to False
+    return_status : boolean, optional
+        Will also return the Status the last Louvain level started from, to
+        pass to the *_from_status functions instead of the graph and the
+        partition. It is not recomputed: its nodes (and node2com) are the
+        communities of the partition, while its raw nodes are the nodes of
+        the graph, so Status.partition groups the nodes as the partition
+        does and Status.rawnode2com gives the community of every node, in
+        sorted node order. Default to False
 
     Returns
     -------
     partition : dictionary
        The partition, with communities numbered from 0 to number of communities
+    status : Status
+       The status of the partition, only if return_status is True
 
     Raises
     ------
@@ -225,14 +268,26 @@ def best_partition(graph, model=None, partition=None,
     >>> nx.draw_networkx_edges(G, pos, alpha=0.5)
     >>> plt.show()
     """
-    dendo = generate_dendrogram(graph,
-                                model,
-                                partition,
-                                weight,
-                                resolution,
-                                randomize,
-                                pars=pars)
-    return partition_at_level(dendo, len(dendo) - 1)
+    levels = __generate_levels(graph, model, partition, weight, resolution,
+                               randomize, pars, parallel, prune,
+                               keep_status=return_status)
+    if levels is None:
+        partition = dict((node, node) for node in graph.nodes())
+        status = None
+    else:
+        labels, levels, status = levels
+        partition = levels[0]
+        for level in levels[1:]:
+            partition = level[partition]
+        partition = dict(zip(labels, partition.tolist()))
+    if return_status:
+        if status is None:
+            # no link, there is no Louvain level to take the status from
+            status = Status()
+            status.init(graph, weight, partition,
+                        nodes=_sorted_nodes(graph))
+        return partition, status
+    return partition
 
 
 def generate_dendrogram(graph,
@@ -241,7 +296,9 @@ def generate_dendrogram(graph,
                         weight='weight',
                         resolution=1.,
                         randomize=False,
-                        pars = None):
+                        pars = None,
+                        parallel=False,
+                        prune=False):
     """Find communities in the graph and return the associated dendrogram
 
     A dendrogram is a tree and each level is a partition of the graph nodes.
@@ -272,6 +329,14 @@ def generate_dendrogram(graph,
        'gamma' within (0,inf) for 'ppm' and 'dcppm' models.
        Also, for 'ppm' model it's possible to use two optional parameters, 
        fixedPin and fixedPout, they could be used to modify the gamma calculation.
+    parallel : boolean, optional
+        Will evaluate the moves of non adjacent nodes in parallel threads
+        (needs numba). The moves of a batch are chosen on the same status,
+        so the partitions differ from the sequential ones. Default to False
+    prune : boolean, optional
+        After the first pass of a level, will only reconsider the nodes with
+        a neighbour moved during the previous pass. Faster on large graphs,
+        but the partitions may differ slightly. Default to False
 
     Returns
     -------
@@ -307,42 +372,72 @@ def generate_dendrogram(graph,
     :param weight:
     :type weight:
     """
-    if graph.is_directed():
-        raise TypeError("Bad graph type, use only non directed graph")
-
-    # special case, when there is no link
-    # the best partition is everyone in its community
-    if graph.number_of_edges() == 0:
+    levels = __generate_levels(graph, model, part_init, weight, resolution,
+                               randomize, pars, parallel, prune)
+    if levels is None:
+        # special case, when there is no link
+        # the best partition is everyone in its community
         part = dict([])
         for node in graph.nodes():
             part[node] = node
         return [part]
+    labels, levels, _ = levels
+    dendrogram = [dict(zip(labels, levels[0].tolist()))]
+    for level in levels[1:]:
+        dendrogram.append(dict(enumerate(level.tolist())))
+    return dendrogram
+
+
+def __generate_levels(graph, model, part_init, weight, resolution,
+                      randomize, pars, parallel, prune, keep_status=False):
+    """Run the Louvain levels behind generate_dendrogram and best_partition
+
+    Return the sorted node labels, the levels as int64 arrays, where
+    level[i] is the community of the i-th node of the level (the i-th label
+    for the first one, the i-th community of the previous level otherwise),
+    and, if keep_status, the status the last level started from (None
+    otherwise), or None if the graph has no link
+    """
+    if graph.is_directed():
+        raise TypeError("Bad graph type, use only non directed graph")
+
+    if graph.number_of_edges() == 0:
+        return None
 
-    current_graph = graph.copy()
+    # the status numbers the nodes 0..N-1 following the sorted labels, and
+    # the induced graphs of the next levels are built on these ids
+    labels = _sorted_nodes(graph)
     status = Status()
-    status.init(current_graph, weight, part_init)
-    status_list = list()
-    __one_level(current_graph, status, weight, resolution, randomize, model=model, pars=pars)
+    status.init(graph, weight, part_init, nodes=labels)
+    levels = list()
+    __one_level(status, resolution, randomize, model=model,
+                    pars=pars, parallel=parallel, prune=prune)
     new_mod = __modularity(status,model=model,pars=pars)
     partition = __renumber(status.node2com)
-    status_list.append(partition)
+    levels.append(partition)
     mod = new_mod
-    current_graph = induced_graph(partition, current_graph, weight)
+    current_graph = __induced_graph(partition, status.adjacency, weight)
 
     status.init(current_graph, weight, raw_partition = __transit(partition,status.rawnode2node), raw_graph=graph)
 
+    last_status = None
     while True:
-        __one_level(current_graph, status, weight, resolution, randomize, model=model, pars=pars)
+        if keep_status:
+            # the last level is not kept, its starting status is the one of
+            # the final partition
+            last_status = status.copy()
+        __one_level(status, resolution, randomize, model=model,
+                    pars=pars, parallel=parallel, prune=prune)
         new_mod = __modularity(status,model=model,pars=pars)
         if new_mod - mod < __MIN:
             break
         partition = __renumber(status.node2com)
-        status_list.append(partition)
+        levels.append(partition)
         mod = new_mod
-        current_graph = induced_graph(partition, current_graph, weight)
+        current_graph = __induced_graph(partition, status.adjacency, weight)
 
         status.init(current_graph, weight, raw_partition = __transit(partition,status.rawnode2node), raw_graph=graph)
-    return status_list[:]
+    return labels, levels, last_status
 
 
 def induced_graph(partition, graph, weight="weight"):
@@ -383,67 +478,94 @@ def induced_graph(partition, graph, weight="weight"):
     ret = nx.Graph()
     ret.add_nodes_from(partition.values())
 
-    for node1, node2, datas in graph.edges(data=True):
-        edge_weight = datas.get(weight, 1)
-        com1 = partition[node1]
-        com2 = partition[node2]
-        w_prec = ret.get_edge_data(com1, com2, {weight: 0}).get(weight, 1)
-        ret.add_edge(com1, com2, **{weight: w_prec + edge_weight})
+    coms = list(ret.nodes())
+    com2idx = dict((com, idx) for idx, com in enumerate(coms))
+    nodes = list(graph.nodes())
+    node2com = np.fromiter((com2idx[partition[node]] for node in nodes),
+                           np.int64, count=len(nodes))
+    adjacency = nx.to_scipy_sparse_array(graph, nodelist=nodes, weight=weight,
+                                         dtype=np.float64)
+    links = __community_links(node2com, adjacency, len(coms))
+    ret.add_weighted_edges_from(((coms[idx1], coms[idx2], edge_weight)
+                                 for idx1, idx2, edge_weight
+                                 in zip(links.row.tolist(), links.col.tolist(),
+                                        links.data.tolist())),
+                                weight=weight)
 
     return ret
 
 
-def __renumber(dictionary):
-    """Renumber the values of the dictionary from 0 to n
+def __induced_graph(partition, adjacency, weight):
+    """Produce the graph of the communities 0..n-1 of the partition array,
+    given the adjacency matrix of the graph of its nodes
     """
-    count = 0
-    ret = dictionary.copy()
-    new_values = dict([])
-
-    for key in dictionary.keys():
-        value = dictionary[key]
-        new_value = new_values.get(value, -1)
-        if new_value == -1:
-            new_values[value] = count
-            new_value = count
-            count += 1
-        ret[key] = new_value
-
+    size = int(partition.max()) + 1
+    links = __community_links(partition, adjacency, size)
+    ret = nx.Graph()
+    ret.add_nodes_from(range(size))
+    ret.add_weighted_edges_from(zip(links.row.tolist(), links.col.tolist(),
+                                    links.data.tolist()),
+                                weight=weight)
     return ret
 
+
+def __community_links(node2com, adjacency, size):
+    """The sparse upper triangular matrix of the link weights between the
+    communities node2com of the nodes of adjacency, in CSR order
+    """
+    # every edge once, self-loops included, then summed per pair of
+    # communities by the conversion to CSR
+    adjacency = sp.triu(adjacency, format='coo')
+    com1 = node2com[adjacency.row]
+    com2 = node2com[adjacency.col]
+    return sp.coo_matrix((adjacency.data,
+                          (np.minimum(com1, com2), np.maximum(com1, com2))),
+                         shape=(size, size)).tocsr().tocoo()
+
+
+def __factorize(labels, count):
+    """Number the hashable labels from 0 in the order of their first
+    appearance, return the ids as an int32 array and the number of labels
+    """
+    label2idx = dict()
+    ids = np.fromiter((label2idx.setdefault(label, len(label2idx))
+                       for label in labels), np.int32, count=count)
+    return ids, len(label2idx)
+
+
+def __renumber(values):
+    """Renumber the values of the array from 0 to n
+    """
+    _, first, inverse = np.unique(values, return_index=True,
+                                  return_inverse=True)
+    # new values follow the order of the first appearance of the old ones
+    new_values = np.empty(len(first), np.int64)
+    new_values[np.argsort(first)] = np.arange(len(first))
+    return new_values[inverse]
+
+
 def __transit(partition,rawnodepart):
     """Map partition of partition to the partition of original nodes
     """
-    res = dict()
-    for n,mn in rawnodepart.items():
-        res[n] = partition[mn]
-    return res
+    nodes = np.fromiter(rawnodepart.values(), np.int64,
+                        count=len(rawnodepart))
+    return dict(zip(rawnodepart.keys(), partition[nodes].tolist()))
 
 
 def load_binary(data):
     """Load binary graph as used by the cpp implementation of this algorithm
     """
-    data = open(data, "rb")
-
-    reader = array.array("I")
-    reader.fromfile(data, 1)
-    num_nodes = reader.pop()
-    reader = array.array("I")
-    reader.fromfile(data, num_nodes)
-    cum_deg = reader.tolist()
-    num_links = reader.pop()
-    reader = array.array("I")
-    reader.fromfile(data, num_links)
-    links = reader.tolist()
+    with open(data, "rb") as data:
+        num_nodes = int(np.fromfile(data, np.uint32, 1)[0])
+        cum_deg = np.fromfile(data, np.uint32, num_nodes).astype(np.int64)
+        num_links = int(cum_deg[-1]) if num_nodes else 0
+        links = np.fromfile(data, np.uint32, num_links)
+    # the source of every link, from the cumulative degrees
+    sources = np.repeat(np.arange(num_nodes),
+                        np.diff(cum_deg, prepend=0))
     graph = nx.Graph()
     graph.add_nodes_from(range(num_nodes))
-    prec_deg = 0
-
-    for index in range(num_nodes):
-        last_deg = cum_deg[index]
-        neighbors = links[prec_deg:last_deg]
-        graph.add_edges_from([(index, int(neigh)) for neigh in neighbors])
-        prec_deg = last_deg
+    graph.add_edges_from(zip(sources.tolist(), links.tolist()))
     return graph
 
 
@@ -478,7 +600,8 @@ def __get_safe_par(model,pars=None):
             par = max(par,__MIN)
     return par
 
-def __one_level(graph, status, weight_key, resolution, randomize, model='ppm', pars = None):
+def __one_level(status, resolution, randomize, model='ppm', pars = None,
+                parallel=False, prune=False):
     """Compute one level of communities
     """
     modified = True
@@ -486,176 +609,100 @@ def __one_level(graph, status, weight_key, resolution, randomize, model='ppm', p
     cur_mod = __modularity(status,model=model,pars=pars)
     new_mod = cur_mod
     par = __get_safe_par(model,pars)
-    __E = float(status.total_weight)
-    __2E = 2.*__E
-    mpar = 1.-par
-    __l2E = 0.
-    __l2Epar = 0.
-    __l2Epar2 = 0.
-    if __E>0:
-        __l2E = log(__2E)
-        if mpar>0.:
-            __l2Epar = log(__2E*mpar/par)
-    if mpar>0.:
-        __l2Epar2 = (log(par/mpar)-__l2E)
-    __lpar = log(par)
-    __l2Epar3 = (__lpar-__l2E)
-    __par2E = par/__2E
+    one_pass, parallel_pass = __ONE_LEVEL.get(model, __ONE_LEVEL['ppm'])
+    (node2com, degrees, gdegrees, internals, loops,
+     indptr, indices, data) = status.to_arrays()
+    size = node2com.shape[0]
     P2 = len(status.rawnode2node)
     P2 = P2*(P2-1)/2.
+    # renumber the nodes in reverse Cuthill-McKee order, so that neighbours
+    # get close ids and the node2com lookups of a row stay cache-local;
+    # community ids are kept, and the nodes are visited in the original
+    # order, so the moves are the same as without the renumbering
+    adjacency = sp.csr_array((data, indices, indptr), shape=(size, size))
+    perm = reverse_cuthill_mckee(adjacency, symmetric_mode=True)
+    iperm = np.empty(size, np.int64)
+    iperm[perm] = np.arange(size)
+    adjacency = adjacency[perm][:, perm]
+    moved2com = node2com[perm]
+    gdegrees = gdegrees[perm]
+    node2size = status.node2size[perm]
+    loops = loops[perm]
+    if parallel:
+        # adjacent nodes get different colors, so the nodes of a color can
+        # choose their moves at the same time
+        colors = greedy_coloring(adjacency.indptr, adjacency.indices)
+        one_pass = partial(parallel_pass, colors)
+    # the passes mark the neighbours of the nodes they move
+    dirty = np.ones(size, np.bool_)
     while modified and nb_pass_done != __PASS_MAX:
         cur_mod = new_mod
-        modified = False
         nb_pass_done += 1
-        for node in __randomly(graph.nodes(), randomize):
-            com_node = status.node2com[node]
-            neigh_communities = __neighcom(node, graph, status, weight_key)
-            v_in_degree = neigh_communities.get(com_node,0)
-
-            if model=='dcppm':
-                com_degree = status.degrees.get(com_node, 0.)
-                v_degree = status.gdegrees.get(node, 0.)
-                pre_calc1 = par * v_degree / __2E
-                remove_cost = pre_calc1 * (com_degree - v_degree) - v_in_degree
-            elif model == 'ilfrs':
-                com_degree = status.degrees.get(com_node, 0.)
-                v_degree = status.gdegrees.get(node, 0.)
-                v_loops  = graph.get_edge_data(node, node, default={weight_key: 0}).get(weight_key, 1)
-                com_in_degree = status.internals.get(com_node, 0.)
-                remove_cost = v_in_degree*__l2Epar2
-                if com_degree>0.:
-                    remove_cost += com_in_degree * log(com_degree)
-                else:
-                    remove_cost += com_in_degree / __MIN
-
-                if com_degree > v_degree: remove_cost -= (com_in_degree - v_loops - v_in_degree) * log(com_degree - v_degree)
-            elif model == 'ilfr':
-                com_degree = status.degrees.get(com_node, 0.)
-                v_degree = status.gdegrees.get(node, 0.)
-                v_loops  = graph.get_edge_data(node, node, default={weight_key: 0}).get(weight_key, 1)
-                com_in_degree = status.internals.get(com_node, 0.)
-                remove_cost = v_in_degree*__l2Epar3
-                if com_degree >0: remove_cost -= com_in_degree*log((mpar/com_degree)+__par2E)
-                if com_degree-v_degree>0: remove_cost += (com_in_degree-v_in_degree-v_loops)*log((mpar/(com_degree-v_degree))+__par2E)
-            else:
-                volume_node = status.node2size[node]
-                volume_cluster = status.com2size[com_node] - volume_node
-                pre_calc1 = par*volume_node/P2
-                remove_cost = volume_cluster*pre_calc1 - v_in_degree/__E 
-            __remove(node, com_node,
-                     neigh_communities.get(com_node, 0.), status)
-
-            best_com = com_node
-            best_increase = 0.
-
-            for com, dnc in __randomly(neigh_communities.items(),
-                                       randomize):
-                if model=='dcppm':
-                    com_degree = status.degrees.get(com, 0.)
-                    add_cost = dnc - pre_calc1 * com_degree
-                elif model == 'ilfrs':
-                    com_in_degree = status.internals.get(com, 0.)
-                    com_degree = status.degrees.get(com, 0.)
-                    add_cost = dnc*__l2Epar
-                    add_cost += com_in_degree*log(com_degree)
-                    add_cost -= (com_in_degree + v_loops + dnc) * log(com_degree + v_degree)
-                elif model == 'ilfr':
-                    com_in_degree = status.internals.get(com, 0.)
-                    com_degree = status.degrees.get(com, 0.)
-                    add_cost = dnc*(__l2E-__lpar)
-                    if com_degree >0: add_cost -= com_in_degree*log((mpar/com_degree)+__par2E)
-                    if com_degree+v_degree>0: add_cost += (com_in_degree+dnc+v_loops)*log((mpar/(com_degree+v_degree))+__par2E)
-                else:
-                    volume_cluster = status.com2size[com]
-                    add_cost = dnc/__E - volume_cluster*pre_calc1
-
-                incr = add_cost + remove_cost
-                
-                if incr > best_increase:
-                    best_increase = incr
-                    best_com = com
-
-            __insert(node, best_com,
-                     neigh_communities.get(best_com, 0.), status)
-
-            if best_com != com_node:
-                modified = True
+        order = iperm[np.fromiter(__randomly(range(size), randomize),
+                                  np.int64, count=size)]
+        if prune:
+            # a node none of whose neighbours has moved during the last
+            # pass most likely stays in its community
+            order = order[dirty[order]]
+        dirty[:] = False
+        if randomize and seed_random is not None:
+            # the community orders follow the random module as the node
+            # order does
+            seed_random(random.randrange(2 ** 32))
+        modified = one_pass(adjacency.indptr, adjacency.indices,
+                            adjacency.data, order, randomize,
+                            moved2com, degrees, gdegrees,
+                            internals, status.com2size,
+                            node2size, loops, par,
+                            float(status.total_weight), P2, dirty)
+        node2com[perm] = moved2com
         if modified:
             new_mod = __modularity(status,model=model,pars=pars)
             if new_mod - cur_mod < __MIN:
                 break
 
-def __neighcom(node, graph, status, weight_key):
-    """
-    Compute the communities in the neighborhood of node in the graph given
-    with the decomposition node2com
-    """
-    weights = {}
-    for neighbor, datas in graph[node].items():
-        if neighbor != node:
-            edge_weight = datas.get(weight_key, 1)
-            neighborcom = status.node2com[neighbor]
-            weights[neighborcom] = weights.get(neighborcom, 0) + edge_weight
-
-    return weights
-
-
-def __remove(node, com, weight, status):
-    """ Remove node from community com and modify status"""
-    status.degrees[com] = (status.degrees.get(com, 0.)
-                           - status.gdegrees.get(node, 0.))
-    status.degrees[-1] = status.degrees.get(-1, 0.)+status.gdegrees.get(node, 0.)
-
-    status.internals[com] = float(status.internals.get(com, 0.) -
-                                  weight - status.loops.get(node, 0.))
-    status.node2com[node] = -1
-    status.internals[-1] = status.loops.get(node, 0.)
-    status.com2size[com] -= status.node2size[node]
-
-def __insert(node, com, weight, status):
-    """ Insert node into community and modify status"""
-    status.node2com[node] = com
-    status.degrees[-1] = status.degrees.get(-1, 0.)-status.gdegrees.get(node, 0.)
-    status.degrees[com] = (status.degrees.get(com, 0.) +
-                           status.gdegrees.get(node, 0.))
-    status.internals[com] = float(status.internals.get(com, 0.) +
-                                  weight + status.loops.get(node, 0.))
-    status.com2size[com] += status.node2size[node]
-
 
 def __get_DLD(status):
     """ Some intermediate optimization
     """
-    return sum(map(lambda x:x*log(x),filter(lambda x:x>0,status.rawnode2degree.values())))
+    degrees = np.fromiter(status.rawnode2degree.values(), np.float64,
+                          count=len(status.rawnode2degree))
+    degrees = degrees[degrees > 0]
+    return float((degrees * np.log(degrees)).sum())
+
+def __get_communities(status):
+    """ Ids of the non-empty communities, i.e. those holding raw nodes
+    """
+    return np.flatnonzero(status.com2size > 0)
 
 def __get_es(status):
     """ Some intermediate optimization
     """
     E = float(status.total_weight)
-    Ein = 0
-    degrees_squared = 0.
-    for community in set(status.node2com.values()):
-        Ein += status.internals.get(community, 0.)
-        tmp = status.degrees.get(community, 0.)
-        degrees_squared += tmp*tmp #status.degrees.get(community, 0.)**2
+    communities = __get_communities(status)
+    Ein = float(status.internals[communities].sum())
+    degrees_squared = float((status.degrees[communities] ** 2).sum())
     Eout = max(0.,E - Ein)
     return E,Ein,Eout,degrees_squared
 
 def __get_SUMDC2_P2in(status):
     """ Some intermediate optimization
     """
-    DC = defaultdict(int)
-    VC = defaultdict(int)
-    for n,mn in status.rawnode2node.items():
-        DC[status.node2com[mn]] += status.rawnode2degree.get(n,0)
-        VC[status.node2com[mn]] += 1
-    SUMDC2 = 0
-    P2in = 0
-    for c,d in DC.items():
-        SUMDC2 += d*d
-        P2in += VC[c]*(VC[c]-1)/2.
+    com = status.rawnode2com
+    DC = np.bincount(com, weights=status.rawdegrees)
+    VC = np.bincount(com)
+    SUMDC2 = float((DC * DC).sum())
+    P2in = float((VC * (VC - 1) / 2.).sum())
     return SUMDC2,P2in
 
+def __get_nonempty_degrees(status):
+    """ Internal and total degrees of the communities with positive degree
+    """
+    communities = __get_communities(status)
+    degree = status.degrees[communities]
+    mask = degree > 0
+    return status.internals[communities][mask], degree[mask]
+
 def __get_pin_pout(status):
     """ Some intermediate optimization
     """
@@ -674,50 +721,71 @@ def __modularity(status,model='ppm',pars = None):
     status precomputed
     """
     par = __get_safe_par(model,pars)
-    if not pars: pars = {}
-    if model=='dcppm':
-        links = float(status.total_weight)
-        result = 0.
-        for community in set(status.node2com.values()):
-            in_degree = status.internals.get(community, 0.)
-            degree = status.degrees.get(community, 0.)
-            if links > 0:
-                result += in_degree / links - par *   ((degree / (2. * links)) ** 2)
-        return result
-    elif model == 'ilfrs':
-        E,Ein,Eout,_ = __get_es(status)
-        result = 0.
-        par = max(par,__MIN)
-        par = min(par,1.-__MIN)
-        result += Eout * log( par )
-        result += Ein * log( 1 - par )
-        result += - Eout * log( 2*E )
-        for community in set(status.node2com.values()):
-            degree = status.degrees.get(community, 0.)
-            if degree>0:
-                result -= status.internals.get(community, 0.)*log(degree)
-        result -= E
-        result += __get_DLD(status)
-        return result
-    elif model == 'ilfr':
-        E,_,Eout,_ = __get_es(status)
-        DLD = __get_DLD(status)
-        par = max(par,__MIN)
-        logl = Eout*log(par)-Eout*log(2*E)+DLD-E
-        for community in set(status.node2com.values()):
-            degree = status.degrees.get(community, 0.)
-            if degree>0:
-                logl += status.internals.get(community, 0.)*log(((1.-par)/degree)+float(par)/(2.*E))
-        return logl
-    else:
-        E,Ein,Eout,_ = __get_es(status)
-        _,P2in = __get_SUMDC2_P2in(status)        
-        P2 = len(status.rawnode2node)
-        P2 = P2*(P2-1)/2.
-        P2out = P2 - P2in
-        P2in = max(P2in,__MIN)
-        P2out = max(P2out,__MIN)
-        return (Ein - par*P2in*E/P2)/E
+    return __MODULARITY.get(model, __modularity_ppm)(status, par)
+
+def __modularity_dcppm(status, par):
+    """ The log likelihood of the 'dcppm' model, up to a constant
+    """
+    links = float(status.total_weight)
+    if links <= 0:
+        return 0.
+    communities = __get_communities(status)
+    in_degree = status.internals[communities]
+    degree = status.degrees[communities]
+    return float((in_degree / links).sum() -
+                 par * ((degree / (2. * links)) ** 2).sum())
+
+def __modularity_ilfrs(status, par):
+    """ The log likelihood of the 'ilfrs' model
+    """
+    E,Ein,Eout,_ = __get_es(status)
+    result = 0.
+    par = max(par,__MIN)
+    par = min(par,1.-__MIN)
+    result += Eout * log( par/(2*E) )
+    result += Ein * log( 1 - par )
+    in_degree, degree = __get_nonempty_degrees(status)
+    result -= (in_degree * np.log(degree)).sum()
+    result -= E
+    result += __get_DLD(status)
+    return float(result)
+
+def __modularity_ilfr(status, par):
+    """ The log likelihood of the 'ilfr' model
+    """
+    E,_,Eout,_ = __get_es(status)
+    DLD = __get_DLD(status)
+    par = max(par,__MIN)
+    logl = Eout*log(par/(2.*E))+DLD-E
+    in_degree, degree = __get_nonempty_degrees(status)
+    mpar = 1.-par
+    par2E = float(par)/(2.*E)
+    logl += (in_degree * np.log(mpar/degree + par2E)).sum()
+    return float(logl)
+
+def __modularity_ppm(status, par):
+    """ The log likelihood of the 'ppm' model, up to a constant
+    """
+    E,Ein,_,_ = __get_es(status)
+    _,P2in = __get_SUMDC2_P2in(status)
+    P2 = len(status.rawnode2node)
+    P2 = P2*(P2-1)/2.
+    P2in = max(P2in,__MIN)
+    return (Ein - par*P2in*E/P2)/E
+
+# the specialized functions of every model, the others fall back to 'ppm'
+__MODULARITY = {
+    'dcppm': __modularity_dcppm,
+    'ilfrs': __modularity_ilfrs,
+    'ilfr': __modularity_ilfr,
+    'ppm': __modularity_ppm,
+}
+__ONE_LEVEL = {
+    'dcppm': (one_level_dcppm, parallel_level_dcppm),
+    'ilfrs': (one_level_ilfrs, parallel_level_ilfrs),
+    'ilfr': (one_level_ilfr, parallel_level_ilfr),
+    'ppm': (one_level_ppm, parallel_level_ppm),
+}
 
 def model_log_likelihood(graph,part_init,model,weight='weight',pars=None):
     """ Estimate log likelihood of the given partition of the graph considering the given model 
@@ -752,9 +820,39 @@ def model_log_likelihood(graph,part_init,model,weight='weight',pars=None):
     >>> partition = best_partition(G, model='ppm', pars={'gamma':0.5})
     >>> model_log_likelihood(G,partition,model='ppm',pars={'gamma':0.5})
     """
-    current_graph = graph.copy()
     status = Status()
-    status.init(current_graph, weight, part_init)
+    status.init(graph, weight, part_init)
+    if model in ('ilfr', 'ilfrs') and not (pars or {}).get('mu',None):
+        pars = {'mu':estimate_mu(graph,part_init)}
+    return model_log_likelihood_from_status(status,model,pars)
+
+def model_log_likelihood_from_status(status,model,pars=None):
+    """ Estimate log likelihood of the partition of a status considering the
+    given model and model's parameter value, as model_log_likelihood does
+    for a graph and its partition.
+
+    Parameters
+    ----------
+    status : Status
+       the status of the partition, e.g. returned by best_partition with
+       return_status=True
+    model : string
+       should be 'ilfr', 'ilfrs', 'ppm' or 'dcppm'
+    pars : dict
+       the model's parameters, as in model_log_likelihood. Without 'mu',
+       'ilfr' and 'ilfrs' use estimate_mu_from_status
+
+    Returns
+    -------
+    r : float
+       log likelihood of the partition considering the graph, the model and its parameter
+
+    Examples
+    --------
+    >>> G=nx.erdos_renyi_graph(100, 0.01)
+    >>> partition, status = best_partition(G, model='ppm', pars={'gamma':0.5}, return_status=True)
+    >>> model_log_likelihood_from_status(status,model='ppm',pars={'gamma':0.5})
+    """
     assert model in ('dcppm','ppm','ilfr','ilfrs'), "Unknown model specified"
     par = __get_safe_par(model,pars)    
     if not pars: pars = {}
@@ -764,7 +862,7 @@ def model_log_likelihood(graph,part_init,model,weight='weight',pars=None):
         result = 0.
         pin = max(pin,__MIN)
         pout = max(pout,__MIN)
-        result += Ein*(log(pin)-log(pout))
+        result += Ein*log(pin/pout)
         result -= (pin-pout)*degrees_squared/(4.*E)
         result += DLD 
         result += E*log(pout)
@@ -773,7 +871,7 @@ def model_log_likelihood(graph,part_init,model,weight='weight',pars=None):
         return result
     elif model in ('ilfr', 'ilfrs'):
         if not pars.get('mu',None): # is None:
-            return __modularity(status,model=model,pars={'mu':estimate_mu(graph,part_init)})
+            return __modularity(status,model=model,pars={'mu':estimate_mu_from_status(status)})
         else:
             return __modularity(status,model=model,pars=pars)
     elif model == 'ppm':
@@ -799,6 +897,98 @@ def model_log_likelihood(graph,part_init,model,weight='weight',pars=None):
             ext_mod += Eout*log(Pout)
         return ext_mod
 
+def model_log_likelihood_delta(status, node, new_com, model, pars=None):
+    """ Change of the log likelihood optimized by best_partition when node
+    moves from its community to new_com, computed from the two communities
+    involved only, without modifying the status.
+
+    Parameters
+    ----------
+    status : Status
+       the status of the current partition, as initialized by Status.init
+    node : node
+       the node to move, one of the nodes of the graph of the status
+    new_com : int
+       the id of the community to move the node into
+    model : string
+       should be 'ilfr', 'ilfrs', 'ppm' or 'dcppm'
+    pars : dict
+       the dict with 'mu' or 'gamma' key and a float value, as in
+       best_partition
+
+    Returns
+    -------
+    r : float
+       the log likelihood of the partition after the move minus the log
+       likelihood before it, as given by the same fast computation as the
+       one used to compare the levels of best_partition
+
+    Examples
+    --------
+    >>> G = nx.karate_club_graph()
+    >>> status = Status()
+    >>> status.init(G, 'weight')
+    >>> model_log_likelihood_delta(status, 0, status.node2idx[1], 'ppm')
+    """
+    assert model in ('dcppm','ppm','ilfr','ilfrs'), "Unknown model specified"
+    idx = status.node2idx[node]
+    old_com = status.node2com[idx]
+    if old_com == new_com:
+        return 0.
+    par = __get_safe_par(model,pars)
+    adjacency = status.adjacency
+    start, end = adjacency.indptr[idx], adjacency.indptr[idx + 1]
+    neighbors = adjacency.indices[start:end]
+    weights = adjacency.data[start:end]
+    neighbor_coms = status.node2com[neighbors]
+    # links to the communities, the self-loop stays with the node
+    not_loop = neighbors != idx
+    weight_old = float(weights[not_loop & (neighbor_coms == old_com)].sum())
+    weight_new = float(weights[not_loop & (neighbor_coms == new_com)].sum())
+    loop = float(status.loops[idx])
+    degree = float(status.gdegrees[idx])
+    E = float(status.total_weight)
+    # internal weight and degree of the two communities, before and after
+    internals = np.array([status.internals[old_com],
+                          status.internals[new_com]], np.float64)
+    moved_internals = internals + [-weight_old - loop, weight_new + loop]
+    degrees = np.array([status.degrees[old_com], status.degrees[new_com]],
+                       np.float64)
+    moved_degrees = degrees + [-degree, degree]
+    delta_in = weight_new - weight_old
+
+    if model == 'ppm':
+        size = status.node2size[idx]
+        P2 = len(status.rawnode2node)
+        P2 = P2*(P2-1)/2.
+        delta_P2in = size * (status.com2size[new_com] + size
+                             - status.com2size[old_com])
+        return float(delta_in/E - par*delta_P2in/P2)
+    if model == 'dcppm':
+        return float(delta_in/E - par*((moved_degrees ** 2).sum()
+                                       - (degrees ** 2).sum())/(4.*E*E))
+
+    def sum_over(internals, degrees, fn):
+        mask = degrees > 0
+        return float((internals[mask] * fn(degrees[mask])).sum())
+
+    if model == 'ilfrs':
+        par = max(par,__MIN)
+        par = min(par,1.-__MIN)
+        result = delta_in * (log(1 - par) - log(par/(2*E)))
+        result -= sum_over(moved_internals, moved_degrees, np.log)
+        result += sum_over(internals, degrees, np.log)
+        return result
+    # ilfr
+    par = max(par,__MIN)
+    mpar = 1.-par
+    par2E = float(par)/(2.*E)
+    log_term = lambda degree: np.log(mpar/degree + par2E)
+    result = -delta_in * log(par/(2.*E))
+    result += sum_over(moved_internals, moved_degrees, log_term)
+    result -= sum_over(internals, degrees, log_term)
+    return result
+
 def estimate_gamma(graph,part_init,weight='weight',model='ppm',pars=None):
     """ Estimate the best gamma value given the model ("ppm" or "dcppm"), 
     the graph, its partition and some optional parameters.
@@ -829,16 +1019,43 @@ def estimate_gamma(graph,part_init,weight='weight',model='ppm',pars=None):
     >>> partition = best_partition(G, model='ppm', pars={'gamma':0.5})
     >>> estimate_gamma(G, partition, model='ppm')
     """
-    current_graph = graph.copy()
     status = Status()
-    status.init(current_graph, weight, part_init)
+    status.init(graph, weight, part_init)
+    return estimate_gamma_from_status(status,model=model,pars=pars)
+
+def estimate_gamma_from_status(status,model='ppm',pars=None):
+    """ Estimate the best gamma value given the model ("ppm" or "dcppm") and
+    the status of a partition, as estimate_gamma does for a graph and its
+    partition.
+
+    Parameters
+    ----------
+    status : Status
+       the status of the partition, e.g. returned by best_partition with
+       return_status=True
+    model : string
+       should be 'ppm' or 'dcppm'
+    pars : dict, optional
+       the optional parameters of the 'ppm' model, as in estimate_gamma
+
+    Returns
+    -------
+    r : float
+       the estimation of the gamma value considering the graph and its partition
+
+    Examples
+    --------
+    >>> G=nx.erdos_renyi_graph(100, 0.01)
+    >>> partition, status = best_partition(G, model='ppm', pars={'gamma':0.5}, return_status=True)
+    >>> estimate_gamma_from_status(status, model='ppm')
+    """
     if not pars: pars = {}    
 
     if model == 'dcppm':
         Pin,Pout,_,_,_,_,_,_ = __get_pin_pout(status)
         Pin = max(Pin,__MIN)
         Pout = max(Pout,__MIN)
-        return (Pin-Pout)/(log(Pin)-log(Pout))
+        return (Pin-Pout)/log(Pin/Pout)
     else:
         E,Ein,Eout,_ = __get_es(status)
         _,P2in = __get_SUMDC2_P2in(status)
@@ -855,7 +1072,7 @@ def estimate_gamma(graph,part_init,weight='weight',model='ppm',pars=None):
             Pout = pars['fixedPout']
         if Pin == 0.: Pin = __MIN
         if Pout == 0.: Pout = __MIN
-        return P2 * (Pin - Pout) / (E * (log(Pin) - log(Pout)))
+        return P2 * (Pin - Pout) / (E * log(Pin/Pout))
 
 def estimate_mu(graph,partition):
     """ Estimate the best mu value given the graph and its partition,
@@ -880,13 +1097,45 @@ def estimate_mu(graph,partition):
     >>> partition = best_partition(G, model='ilfrs', pars={'mu':0.5})
     >>> estimate_mu(G, partition)
     """
-    Eout = 0
     Gsize = graph.size()
-    for n1,n2 in graph.edges(): #links:
-        if partition[n1] != partition[n2]: 
-            Eout += 1
+    nodes = list(graph)
+    # every edge once, self-loops included
+    edges = sp.triu(nx.to_scipy_sparse_array(graph, nodelist=nodes,
+                                             weight=None), format='coo')
+    # communities as integers, only the linked nodes need one
+    linked = np.union1d(edges.row, edges.col)
+    com2idx = dict()
+    com = np.zeros(len(nodes), np.int64)
+    com[linked] = [com2idx.setdefault(partition[nodes[node]], len(com2idx))
+                   for node in linked.tolist()]
+    Eout = edges.data[com[edges.row] != com[edges.col]].sum()
     return float(Eout)/Gsize
 
+def estimate_mu_from_status(status):
+    """ Estimate the best mu value given the status of a partition, the
+    weighted counterpart of estimate_mu: the share of the weight of the
+    links between communities, the same as estimate_mu for unweighted graphs
+
+    Parameters
+    ----------
+    status : Status
+       the status of the partition, e.g. returned by best_partition with
+       return_status=True
+
+    Returns
+    -------
+    r : float
+       the estimation of the mu value considering the graph and its partition
+
+    Examples
+    --------
+    >>> G=nx.erdos_renyi_graph(100, 0.01)
+    >>> partition, status = best_partition(G, model='ilfrs', pars={'mu':0.5}, return_status=True)
+    >>> estimate_mu_from_status(status)
+    """
+    E,_,Eout,_ = __get_es(status)
+    return Eout/E
+
 def ilfr_mu_loglikelihood(graph,partition,current_mu=None,model=None,weight='weight'):
     """ Compute log likelihood for the given mu value considering 
     the graph and the partition.
@@ -917,85 +1166,82 @@ def ilfr_mu_loglikelihood(graph,partition,current_mu=None,model=None,weight='wei
     >>> ilfr_mu_loglikelihood(G, partition, 0.5, model='ilfr')
     """
     if model == 'ilfr':
-        current_graph = graph.copy()
         status = Status()
-        status.init(current_graph, weight, partition)
+        status.init(graph, weight, partition)
         E,_,Eout,_ = __get_es(status)
         if current_mu is None: current_mu = Eout/float(E)
         current_mu = max(current_mu,__MIN)
         current_mu = min(current_mu,1.-__MIN)
         res_mu = Eout*log(current_mu)
-        for community in set(status.node2com.values()):
-            degree = status.degrees.get(community, 0.)
-            in_degree = 2*status.internals.get(community, 0.)
-            if degree>0:
-                res_mu += in_degree*log(((1.-current_mu)/degree)+current_mu/(2.*E))/2.
-        return res_mu
+        in_degree, degree = __get_nonempty_degrees(status)
+        mmu = 1.-current_mu
+        mu2E = current_mu/(2.*E)
+        res_mu += (in_degree*np.log(mmu/degree + mu2E)).sum()
+        return float(res_mu)
+
     return None
 
 def _eta(data):
-    """ Compute eta for NMI calculation
+    """ Compute eta for NMI calculation, data holds community indices
     """
-    # if len(data) <= 1: return 0
-    ldata = len(list(data))
-    if ldata <= 1: return 0
-    _exp = exp(1)
-    counts = Counter()
-    for d in data:
-        counts[d] += 1
-    # probs = [float(c) / len(data) for c in counts.values()]
-    probs = [float(c) / ldata for c in counts.values()]
-    probs = [p for p in probs if p > 0.]
-    ent = 0
-    for p in probs:
-        if p > 0.:
-            ent -= p * log(p, _exp)
-    return ent
+    if len(data) <= 1: return 0
+    counts = np.bincount(data)
+    counts = counts[counts > 0]
+    probs = counts / float(counts.sum())
+    return float(-xlogy(probs, probs).sum())
 
 def _nmi(x, y):
-    """ Calculate NMI without including extra libraries
+    """ Calculate the geometric and arithmetic NMI of x and y, from the mutual
+    information of scikit-learn if it is installed
     """
-    # print(x,y)
-    # print(list(x))
-    sum_mi = 0.0
-    x_value_list = list(set(x))
-    y_value_list = list(set(y))
-    lx = len(list(x))
-    ly = len(list(y))
-    Px = []
-    for xval in x_value_list:
-        # Px.append( len(filter(lambda q:q==xval,x))/float(lx) )
-        Px.append( len(list(filter(lambda q:q==xval,x)))/float(lx) )
-    Py = []
-    for yval in y_value_list:
-        # Py.append( len(filter(lambda q:q==yval,y))/float(ly) )
-        Py.append( len(list(filter(lambda q:q==yval,y)))/float(ly) )
-
-    for i in range(len(x_value_list)):
-        if Px[i] ==0.:
-            continue
-        sy = []
-        for j,yj in enumerate(y):
-            if x[j] == x_value_list[i]:
-                sy.append( yj )
-        if len(sy)== 0:
-            continue
-        pxy = []
-        for yval in y_value_list:
-            # pxy.append( len(filter(lambda q:q==yval,sy))/float(ly) )
-            pxy.append( len(list(filter(lambda q:q==yval,sy)))/float(ly) )
-
-        t = []
-        for j,q in enumerate(Py):
-            if q>0:
-                t.append( pxy[j]/Py[j] / Px[i])
-            else:
-                t.append( -1 )
-            if t[-1]>0:
-                sum_mi += (pxy[j]*log( t[-1]) )
-    eta_xy = _eta(x)*_eta(y)
+    eta_x = _eta(x)
+    eta_y = _eta(y)
+    eta_xy = eta_x*eta_y
     if eta_xy == 0.: return 0.,0.
-    return sum_mi/sqrt(_eta(x)*_eta(y)),2.*sum_mi/(_eta(x)+_eta(y))
+    if mutual_info_score is not None:
+        sum_mi = float(mutual_info_score(x, y))
+    else:
+        sum_mi = _mutual_info(x, y)
+    return sum_mi/sqrt(eta_xy),2.*sum_mi/(eta_x+eta_y)
+
+def _mutual_info(x, y):
+    """ Calculate the mutual information of the community indices x and y
+    from their sparse contingency table
+    """
+    size = float(len(x))
+    px = np.bincount(x) / size
+    py = np.bincount(y) / size
+    # the joint distribution as a sparse contingency table
+    joint = sp.coo_matrix((np.ones(len(x)), (x, y)),
+                          shape=(len(px), len(py)))
+    joint = joint.tocsr().tocoo()
+    pxy = joint.data / size
+    return float((pxy * np.log(pxy / (px[joint.row] * py[joint.col]))).sum())
+
+def _aligned_label_arrays(p1, p2):
+    """ Align the partitions p1 and p2 on their common nodes
+
+    Return the community indices in p1 and in p2 of the common nodes, as
+    int32 arrays in the same node order, and the sizes of the communities
+    of p1 and of p2 over all their nodes. Two arrays are taken as the
+    communities of the same nodes, in the same order
+    """
+    if isinstance(p1, np.ndarray) and isinstance(p2, np.ndarray):
+        x, _ = __factorize(p1.tolist(), len(p1))
+        y, _ = __factorize(p2.tolist(), len(p2))
+        return x, y, np.bincount(x), np.bincount(y)
+    com2idx1 = dict()
+    com2idx2 = dict()
+    coms1 = np.fromiter((com2idx1.setdefault(com, len(com2idx1))
+                         for com in p1.values()), np.int32, count=len(p1))
+    coms2 = np.fromiter((com2idx2.setdefault(com, len(com2idx2))
+                         for com in p2.values()), np.int32, count=len(p2))
+    common = np.fromiter((node in p2 for node in p1), np.bool_, count=len(p1))
+    x = coms1[common]
+    y = np.fromiter((com2idx2[p2[node]] for node in p1 if node in p2),
+                    np.int32, count=len(x))
+    return (x, y, np.bincount(coms1, minlength=len(com2idx1)),
+            np.bincount(coms2, minlength=len(com2idx2)))
 
 def compare_partitions(p1,p2,safe=True):
     """Compute three metrics of two partitions similarity:
@@ -1005,10 +1251,12 @@ def compare_partitions(p1,p2,safe=True):
 
     Parameters
     ----------
-    p1 : dict
-       a first partition
-    p2 : dict
-       a second partition
+    p1 : dict or numpy.ndarray
+       a first partition, or the community of every node as an array
+       (e.g. Status.rawnode2com)
+    p2 : dict or numpy.ndarray
+       a second partition, an array if p1 is one, with the nodes in the same
+       order
 
     Returns
     -------
@@ -1022,31 +1270,24 @@ def compare_partitions(p1,p2,safe=True):
     >>> part2 = best_partition(G, model='dcppm', pars={'gamma':0.5})
     >>> compare_partitions(part1, part2)
     """
-    assert not set(p1.keys())^set(p2.keys()) or not safe, 'You tried to compare partitions with different numbers of nodes. Consider using safe=False flag for compare_partitions() call.'
-    p1_sets = defaultdict(set)
-    p2_sets = defaultdict(set)
-    [p1_sets[item[1]].add(item[0]) for item in p1.items()]
-    [p2_sets[item[1]].add(item[0]) for item in p2.items()]
-    p1_sets = p1_sets.values()
-    p2_sets = p2_sets.values()
-    cross_tab = [[0, 0], [0, 0]]
-    for a1, s1 in enumerate(p1_sets):
-        for a2, s2 in enumerate(p2_sets):
-            common = len(s1 & s2)
-            l1 = len(s1) - common
-            l2 = len(s2) - common
-            cross_tab[0][0] += common * (common-1)
-            cross_tab[1][0] += common * l2
-            cross_tab[0][1] += l1 * common
-            cross_tab[1][1] += l1 * l2
-    [[a00, a01], [a10, a11]] = cross_tab
-    # print(p1)
-    # print(p2)
-    p1_vec = list(map(lambda x:x[1],sorted(p1.items(),key=lambda x:x[0])))
-    p2_vec = list(map(lambda x:x[1],sorted(p2.items(),key=lambda x:x[0])))
-    # p1_vec = list(p1_vec)[:]
-    # print(list(p1_vec)[:])
-    nmis = _nmi(p1_vec,p2_vec)
+    if isinstance(p1, np.ndarray) or isinstance(p2, np.ndarray):
+        assert isinstance(p1, np.ndarray) and isinstance(p2, np.ndarray) and len(p1) == len(p2), 'You tried to compare an array partition with a dict or an array of a different size.'
+    else:
+        assert not set(p1.keys())^set(p2.keys()) or not safe, 'You tried to compare partitions with different numbers of nodes. Consider using safe=False flag for compare_partitions() call.'
+    x, y, sizes1, sizes2 = _aligned_label_arrays(p1, p2)
+    # pair counts from the contingency table of the common nodes, where
+    # table[i, j] is the number of nodes in the i-th community of p1 and
+    # in the j-th community of p2
+    table = sp.coo_matrix((np.ones(len(x), np.int64), (x, y)),
+                          shape=(len(sizes1), len(sizes2))).tocsr()
+    rows = np.bincount(x, minlength=len(sizes1))
+    cols = np.bincount(y, minlength=len(sizes2))
+    sum_sq = int((table.data ** 2).sum())
+    a00 = sum_sq - len(x)
+    a01 = int((sizes1 * rows).sum()) - sum_sq
+    a10 = int((sizes2 * cols).sum()) - sum_sq
+    a11 = int(sizes1.sum()) * int(sizes2.sum()) - a01 - a10 - sum_sq
+    nmis = _nmi(x, y)
     res = {
         'nmi': nmis[0],
         'nmi_arithm': nmis[1],
@@ -16,33 +16,63 @@ __author__ = """Liudmila Ostroumova Prokhorenkova (ostroumova-la@yandex-team.ru)
 #    BSD license.
 
 
+import copy
+from collections import Counter
+from itertools import chain
+
+import networkx as nx
+import numpy as np
+import scipy.sparse as sp
+
+
 class Status(object):
     """
     To handle several data in one struct.
 
     Could be replaced by named tuple, but don't want to depend on python 2.6
+
+    Nodes are relabeled to contiguous integer ids 0..N-1 by `init`
+    (`nodes` holds the original labels, `node2idx` the reverse map), so the
+    per-node and per-community fields are NumPy arrays indexed by these ids.
+    Community ids and sizes are stored as int32, the weights stay float64
+    since the likelihood gains compare differences of large sums.
+    `rawmetanodes` and `rawdegrees` hold the node and the degree of every
+    raw node, in the order of `rawnode2node`, and `rawnode2com` its
+    community.
+    `adjacency` is the CSR adjacency matrix of the graph over the same ids.
     """
-    node2com = {}
+    nodes = []
+    node2idx = {}
+    node2com = None
     total_weight = 0
-    internals = {}
-    degrees = {}
-    gdegrees = {}
+    internals = None
+    degrees = None
+    gdegrees = None
+    loops = None
+    adjacency = None
     rawnode2node = {}
     rawnode2degree = {}
-    com2size = {}
-    node2size = {}
+    rawmetanodes = None
+    rawdegrees = None
+    com2size = None
+    node2size = None
 
     def __init__(self):
-        self.node2com = dict([])
+        self.nodes = []
+        self.node2idx = {}
+        self.node2com = np.zeros(0, np.int32)
         self.total_weight = 0
-        self.degrees = dict([])
-        self.gdegrees = dict([])
-        self.internals = dict([])
-        self.loops = dict([])
-        self.rawnode2node = dict([])
-        self.rawnode2degree = dict([])
-        self.com2size = dict([])
-        self.node2size = dict([])
+        self.degrees = np.zeros(0, np.float64)
+        self.gdegrees = np.zeros(0, np.float64)
+        self.internals = np.zeros(0, np.float64)
+        self.loops = np.zeros(0, np.float64)
+        self.adjacency = sp.csr_array((0, 0))
+        self.rawnode2node = {}
+        self.rawnode2degree = {}
+        self.rawmetanodes = np.zeros(0, np.int64)
+        self.rawdegrees = np.zeros(0, np.float64)
+        self.com2size = np.zeros(0, np.int32)
+        self.node2size = np.zeros(0, np.int32)
 
     def __str__(self):
         return ("node2com : " + str(self.node2com) + " degrees : "
@@ -54,78 +84,216 @@ class Status(object):
                 )
     def copy(self):
         """Perform a deep copy of status"""
-        new_status = Status()
-        new_status.node2com = self.node2com.copy()
-        new_status.rawnode2node = self.rawnode2node.copy()
-        new_status.com2size = self.com2size.copy()
-        new_status.internals = self.internals.copy()
-        new_status.degrees = self.degrees.copy()
-        new_status.gdegrees = self.gdegrees.copy()
-        new_status.total_weight = self.total_weight
-        new_status.rawnode2degree = self.rawnode2degree.copy()
-
-    def init(self, graph, weight, part=None, raw_partition=None, raw_graph=None):
-        """Initialize the status of a graph with every node in one community"""
-        self.rawnode2node = dict([])
-        self.rawnode2degree = dict([])
-        self.com2size = dict([])
-        self.node2size = dict([])
-        self.node2com = dict([])
-        self.total_weight = 0
-        self.degrees = dict([])
-        self.gdegrees = dict([])
-        self.internals = dict([])
-        self.total_weight = graph.size(weight=weight)
-        count = 0
+        # the fields are arrays, dicts, lists and numbers, a shallow copy of
+        # each one is enough to make the new status independent
+        new_status = copy.copy(self)
+        new_status.__dict__.update((key, copy.copy(value))
+                                   for key, value in self.__dict__.items())
+        return new_status
+
+    @property
+    def rawnode2com(self):
+        """The community of every raw node as an array, in the order of
+        rawnode2node, built from node2com on each access
+        """
+        return self.node2com[self.rawmetanodes]
+
+    @property
+    def partition(self):
+        """The community of every raw node as a dict, built from node2com on
+        each access. The raw nodes are the nodes of the original graph, also
+        when the status is the one of an induced graph
+        """
+        return dict(zip(self.rawnode2node, self.rawnode2com.tolist()))
+
+    @property
+    def num_communities(self):
+        """The number of non-empty communities"""
+        return int(np.count_nonzero(self.com2size))
+
+    def to_arrays(self):
+        """The arrays the local moving kernels work on
+
+        Returns
+        -------
+        arrays : tuple
+            node2com, degrees, gdegrees, internals and loops, then the
+            indptr, indices and data of the CSR adjacency, all indexed by
+            the node and community ids of the status. They are not copies,
+            the kernels update the status in place
+        """
+        adjacency = self.adjacency
+        return (self.node2com, self.degrees, self.gdegrees, self.internals,
+                self.loops, adjacency.indptr, adjacency.indices,
+                adjacency.data)
+
+    def init(self, graph, weight, part=None, raw_partition=None, raw_graph=None,
+             nodes=None):
+        """Initialize the status of a graph with every node in one community,
+        or in its community of part. The node ids follow nodes if given,
+        otherwise the sorted nodes without part and the graph order with it
+        """
+        if nodes is not None:
+            self.nodes = nodes
+        elif part is None:
+            self.nodes = _sorted_nodes(graph)
+        else:
+            self.nodes = list(graph.nodes())
+        size = len(self.nodes)
+        self.node2idx = dict(zip(self.nodes, range(size)))
+        adjacency = self.adjacency = _graph_to_csr(graph, weight, self.nodes)
+        rows = np.repeat(np.arange(size), np.diff(adjacency.indptr))
+        cols = adjacency.indices
+        # self-loops are stored once, on the diagonal, and count twice in the
+        # degree
+        self.loops = adjacency.diagonal()
+        self.gdegrees = np.bincount(rows, weights=adjacency.data,
+                                    minlength=size) + self.loops
+        self.total_weight = float(self.gdegrees.sum()) / 2.
+        if raw_partition is None:
+            self.rawnode2node = self.node2idx.copy()
+        else:
+            self.rawnode2node = dict((node, self.node2idx[metanode])
+                                     for node, metanode
+                                     in raw_partition.items())
         if part is None:
-            for node in sorted(graph.nodes()):
-                if raw_partition is None:
-                    self.rawnode2node[node] = node
-                self.node2com[node] = count
-                deg = float(graph.degree(node, weight=weight))
-                if deg < 0:
-                    error = "Bad graph type ({})".format(type(graph))
-                    raise ValueError(error)
-                self.degrees[count] = deg
-                self.gdegrees[node] = deg
-                edge_data = graph.get_edge_data(node, node, default={weight: 0})
-                self.loops[node] = float(edge_data.get(weight, 1))
-                self.internals[count] = self.loops[node]
-                count += 1
+            if (self.gdegrees < 0).any():
+                error = "Bad graph type ({})".format(type(graph))
+                raise ValueError(error)
+            self.node2com = np.arange(size, dtype=np.int32)
+            self.degrees = self.gdegrees.copy()
+            self.internals = self.loops.copy()
         else:
-            for node in graph.nodes():
-                if raw_partition is None:
-                    self.rawnode2node[node] = node
-                com = part[node]
-                # self.rawnode2node[node] = com
-                self.node2com[node] = com
-                deg = float(graph.degree(node, weight=weight))
-                self.degrees[com] = self.degrees.get(com, 0) + deg
-                self.gdegrees[node] = deg
-                inc = 0.
-                for neighbor, datas in graph[node].items():
-                    edge_weight = datas.get(weight, 1)
-                    if edge_weight <= 0:
-                        error = "Bad graph type ({})".format(type(graph))
-                        raise ValueError(error)
-                    if part[neighbor] == com:
-                        if neighbor == node:
-                            inc += float(edge_weight)
-                        else:
-                            inc += float(edge_weight) / 2.
-                self.internals[com] = self.internals.get(com, 0) + inc
-        if raw_partition:
-            for node,metanode in raw_partition.items():
-                self.rawnode2node[node] = metanode
-        for com in set(self.node2com.values()):
-            self.com2size[com] = 0
-        for rawnode,node in self.rawnode2node.items():
-            self.com2size[ self.node2com[node] ] += 1
-            if node not in self.node2size:
-                self.node2size[ node ] = 0
-            self.node2size[ node ] += 1
+            if (adjacency.data <= 0).any():
+                error = "Bad graph type ({})".format(type(graph))
+                raise ValueError(error)
+            # community labels are relabeled to 0..C-1 as well, in the order
+            # of their first appearance, so they need not be comparable
+            com2idx = {}
+            self.node2com = np.fromiter((com2idx.setdefault(part[node],
+                                                            len(com2idx))
+                                         for node in self.nodes),
+                                        np.int32, count=size)
+            self.degrees = np.bincount(self.node2com, weights=self.gdegrees,
+                                       minlength=size)
+            # every link once, from the upper triangle, self-loops included
+            inside = ((rows <= cols) &
+                      (self.node2com[rows] == self.node2com[cols]))
+            self.internals = np.bincount(self.node2com[rows[inside]],
+                                         weights=adjacency.data[inside],
+                                         minlength=size)
+        # there are never more communities than nodes
+        metanodes = np.fromiter(self.rawnode2node.values(), np.int64,
+                                count=len(self.rawnode2node))
+        self.node2size = np.bincount(metanodes,
+                                     minlength=size).astype(np.int32)
+        self.com2size = np.bincount(self.node2com[metanodes],
+                                    minlength=size).astype(np.int32)
         if raw_graph is None:
             raw_graph = graph
-        for edge in raw_graph.edges():
-            self.rawnode2degree[edge[0]] = self.rawnode2degree.get(edge[0],0)+1
-            self.rawnode2degree[edge[1]] = self.rawnode2degree.get(edge[1],0)+1
+        self.rawnode2degree = _raw_degrees(raw_graph)
+        self.rawmetanodes = metanodes
+        self.rawdegrees = np.fromiter((self.rawnode2degree.get(node, 0)
+                                       for node in self.rawnode2node),
+                                      np.float64, count=len(metanodes))
+
+
+def _graph_cache(graph):
+    """The dict where the arrays derived from graph are cached, or None
+
+    It lives in the networkx cache of the graph, which networkx empties
+    whenever nodes or edges are added or removed, so repeated calls on the
+    same graph reuse them. networkx does not empty it when edge attributes
+    are changed in place, so only what depends on the nodes and edges alone
+    is kept there, never the weights nor copies of the graph.
+    """
+    cache = getattr(graph, '__networkx_cache__', None)
+    if cache is None:
+        return None
+    return cache.setdefault('community_ext', {})
+
+
+def _sorted_nodes(graph):
+    """The sorted nodes of graph, as a list cached with the graph that must
+    not be modified
+    """
+    cache = _graph_cache(graph)
+    if cache is not None and 'sorted_nodes' in cache:
+        return cache['sorted_nodes']
+    nodes = sorted(graph.nodes())
+    if cache is not None:
+        cache['sorted_nodes'] = nodes
+    return nodes
+
+
+def _raw_degrees(graph):
+    """The number of links of every linked node of graph, self-loops
+    counted twice, as a Counter cached with the graph
+    """
+    cache = _graph_cache(graph)
+    if cache is not None and 'degrees' in cache:
+        return cache['degrees']
+    degrees = Counter(chain.from_iterable(graph.edges()))
+    if cache is not None:
+        cache['degrees'] = degrees
+    return degrees
+
+
+def _graph_to_csr(graph, weight, nodes):
+    """The weighted adjacency matrix of graph in CSR form, rows and columns
+    following nodes, self-loops stored once on the diagonal.
+
+    Only the structure (indptr, indices and the edge attribute dicts in the
+    order of the stored values) is cached with the graph, the weights are
+    read from the edges on every call, so edges reweighted in place are
+    taken into account. The result must not be modified
+    """
+    if graph.is_multigraph():
+        if not nodes:
+            return sp.csr_array((0, 0))
+        return nx.to_scipy_sparse_array(graph, nodelist=nodes, weight=weight,
+                                        dtype=np.float64, format='csr')
+    cache = _graph_cache(graph)
+    structure = None
+    if cache is not None and 'csr' in cache:
+        cached_nodes, structure = cache['csr']
+        if cached_nodes != nodes:
+            structure = None
+    if structure is None:
+        structure = _csr_structure(graph, nodes)
+        if cache is not None:
+            cache['csr'] = (list(nodes), structure)
+    indptr, indices, datas = structure
+    if weight is None:
+        data = np.ones(len(datas))
+    else:
+        data = np.fromiter((edge.get(weight, 1) for edge in datas),
+                           np.float64, count=len(datas))
+    size = len(nodes)
+    return sp.csr_array((data, indices, indptr), shape=(size, size))
+
+
+def _csr_structure(graph, nodes):
+    """The indptr and sorted indices of the adjacency matrix of graph, with
+    the attribute dict of the edge behind every stored value
+    """
+    node2idx = dict(zip(nodes, range(len(nodes))))
+    rows = list()
+    cols = list()
+    datas = list()
+    for node1, node2, edge in graph.edges(data=True):
+        idx1 = node2idx[node1]
+        idx2 = node2idx[node2]
+        rows.append(idx1)
+        cols.append(idx2)
+        datas.append(edge)
+        if idx1 != idx2:
+            rows.append(idx2)
+            cols.append(idx1)
+            datas.append(edge)
+    rows = np.array(rows, dtype=np.int32)
+    cols = np.array(cols, dtype=np.int32)
+    order = np.lexsort((cols, rows))
+    indptr = np.zeros(len(nodes) + 1, dtype=np.int32)
+    np.cumsum(np.bincount(rows, minlength=len(nodes)), out=indptr[1:])
+    return indptr, cols[order], [datas[pos] for pos in order.tolist()]
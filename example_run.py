@@ -2,38 +2,15 @@
 #!/usr/bin/env python
 
 from __future__ import print_function
+from collections import deque
 import community_ext
-import networkx as nx
+from example_utils import load_edges_and_clusters, run_methods, worker_data
 
-fn1 = "datasets/polblogs/polblogs.edges"
-fn2 = fn1.replace(".edges",".clusters")
-print("DATASET:",fn1)
-
-# load graph
-G = nx.Graph()
-for line in open(fn1):
-    from_node, to_node = map(int, line.rstrip().split("\t"))
-    if from_node not in G or to_node not in G[from_node]:
-        G.add_edge(from_node,to_node)
-
-# load the ground-truth partition
-groundtruth_partition = dict()
-for line in open(fn2):
-    node, cluster = map(int, line.rstrip().split("\t"))
-    if node not in G.nodes(): continue 
-    groundtruth_partition[node] = cluster
-
-# print some general info
-gt_mu = community_ext.estimate_mu(G,groundtruth_partition)
-print("ground truth mu\t",gt_mu)
-print("ground truth clusters\t",len(set(groundtruth_partition.values())))
-print("ground truth modularity\t", community_ext.modularity(groundtruth_partition,G))
-
-# now cycle thru the methods and optimize with each one
-methods = ('ppm','dcppm','ilfrs')
-
-for method in methods:
-    print('\nMethod', method)
+# the iterative optimization with one method, the lines to print are
+# returned so that the output of the methods does not interleave
+def run_method(method):
+    G, groundtruth_partition = worker_data()
+    lines = ['\nMethod %s' % method]
     # a starting parameter value depends on the method
     if method in ('ilfrs',):
         work_par = 0.5
@@ -42,33 +19,61 @@ for method in methods:
 
     # now start the iterative process    
     prev_par, it = -1, 0
-    prev_pars = set()
+    prev_pars = deque(maxlen=8) # the last parameter values
+    prev_partition = None
     while abs(work_par-prev_par)>1e-5: # stop if the size of improvement too small
         it += 1
         if it>100: break # stop after 100th iteration
 
         # update the parameter value
         prev_par = work_par
-        if prev_par in prev_pars: break # stop if we are in the cycle
-        prev_pars.add(prev_par)
+        if any(abs(prev_par-p)<1e-4 for p in prev_pars): break # stop if we are in the cycle
+        prev_pars.append(prev_par)
 
         # find the optimal partition with the current parameter value
+        # with its status, to estimate the parameter and the log likelihood
+        # without going through the graph again
         if method in ('ilfrs',):
-            partition = community_ext.best_partition(G,model=method,pars={'mu':work_par})
+            partition, status = community_ext.best_partition(G,model=method,pars={'mu':work_par},return_status=True)
         else:
-            partition = community_ext.best_partition(G,model=method,pars={'gamma':work_par})
+            partition, status = community_ext.best_partition(G,model=method,pars={'gamma':work_par},return_status=True)
+
+        if partition == prev_partition: break # stop if the partition did not change
+        prev_partition = partition
 
         # calculate optimal parameter value for the current partition
         if method in ('ilfrs',):
-            work_par = community_ext.estimate_mu(G,partition)
+            work_par = community_ext.estimate_mu_from_status(status)
         else:
-            work_par = community_ext.estimate_gamma(G,partition,model=method)
-        loglike =   community_ext.model_log_likelihood(G,partition,model=method,pars={'gamma':work_par,'mu':work_par})
-        print('current par',work_par,'loglike',loglike)
+            work_par = community_ext.estimate_gamma_from_status(status,model=method)
+        loglike =   community_ext.model_log_likelihood_from_status(status,model=method,pars={'gamma':work_par,'mu':work_par})
+        lines.append('current par %s loglike %s' % (work_par, loglike))
 
-    # calculate and print the scores of resulting partition
+    # calculate the scores of resulting partition
     part_scores = community_ext.compare_partitions(groundtruth_partition,partition)
-    loglike =   community_ext.model_log_likelihood(G,partition,model=method,pars={'gamma':work_par,'mu':work_par})
-    print('best par',work_par)
-    print("rand\t% 0f\tjaccard\t% 0f\tnmi\t% 0f\tnmi_arithm\t% 0f\tsize\t%d\tloglike\t% 0f" %\
-            (part_scores['rand'], part_scores['jaccard'], part_scores['nmi'], part_scores['nmi_arithm'], len(set(partition.values())), loglike))
+    loglike =   community_ext.model_log_likelihood_from_status(status,model=method,pars={'gamma':work_par,'mu':work_par})
+    lines.append('best par %s' % work_par)
+    lines.append("rand\t% 0f\tjaccard\t% 0f\tnmi\t% 0f\tnmi_arithm\t% 0f\tsize\t%d\tloglike\t% 0f" %\
+            (part_scores['rand'], part_scores['jaccard'], part_scores['nmi'], part_scores['nmi_arithm'], status.num_communities, loglike))
+    return lines
+
+
+if __name__ == '__main__':
+    fn1 = "datasets/polblogs/polblogs.edges"
+    fn2 = fn1.replace(".edges",".clusters")
+    print("DATASET:",fn1)
+
+    # load graph and the ground-truth partition
+    G, groundtruth_partition = load_edges_and_clusters(fn1, fn2)
+
+    # print some general info
+    gt_mu = community_ext.estimate_mu(G,groundtruth_partition)
+    print("ground truth mu\t",gt_mu)
+    print("ground truth clusters\t",len(set(groundtruth_partition.values())))
+    print("ground truth modularity\t", community_ext.modularity(groundtruth_partition,G))
+
+    # now optimize with each method, the methods are independent so they
+    # run in parallel processes; the results are printed in the methods order
+    methods = ('ppm','dcppm','ilfrs')
+
+    run_methods(run_method, methods, G, groundtruth_partition)
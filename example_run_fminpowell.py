@@ -3,72 +3,70 @@
 
 from __future__ import print_function
 import community_ext
-import networkx as nx
-import scipy
+from example_utils import load_edges_and_clusters, run_methods, worker_data
+from scipy.optimize import minimize_scalar
 
 # optimization routine
 def opt_par(G,method,par):
+    # every evaluation runs a full Louvain, so keep the results to reuse the
+    # one at the optimal parameter value
+    results = dict()
     def opt_fn(work_par):
-        work_par = work_par[0]
         if method in ('ilfrs','ilfr'):
-            partition = community_ext.best_partition(G,model=method,pars={'mu':work_par})
-            loglike =   community_ext.model_log_likelihood(G,partition,model=method,pars={'mu':work_par})
+            partition, status = community_ext.best_partition(G,model=method,pars={'mu':work_par},return_status=True)
+            loglike =   community_ext.model_log_likelihood_from_status(status,model=method,pars={'mu':work_par})
         else:
-            partition = community_ext.best_partition(G,model=method,pars={'gamma':work_par})
-            loglike =   community_ext.model_log_likelihood(G,partition,model=method,pars={'gamma':work_par})
+            partition, status = community_ext.best_partition(G,model=method,pars={'gamma':work_par},return_status=True)
+            loglike =   community_ext.model_log_likelihood_from_status(status,model=method,pars={'gamma':work_par})
+        results[work_par] = partition, status, loglike
         return -loglike
 
-    # find the optimal parameter value
-    best_par = float(scipy.optimize.fmin_powell(opt_fn, par, full_output = False,disp = False))
+    # find the optimal parameter value with a scalar search, bracketed by
+    # the starting value and its half
+    res = minimize_scalar(opt_fn, bracket=(par/2., par), method='brent', options={'xtol': 1e-4})
+    best_par = float(res.x)
 
-    # calculate the partition with the optimal parameter value
-    if method in ('ilfrs','ilfr'):
-        partition = community_ext.best_partition(G,model=method,pars={'mu':best_par})
-        loglike =   community_ext.model_log_likelihood(G,partition,model=method,pars={'mu':best_par})
-    else:
-        partition = community_ext.best_partition(G,model=method,pars={'gamma':best_par})
-        loglike =   community_ext.model_log_likelihood(G,partition,model=method,pars={'gamma':best_par})
-    return partition, loglike, best_par
-
-
-fn1 = "datasets/polblogs/polblogs.edges"
-fn2 = fn1.replace(".edges",".clusters")
-print("DATASET:",fn1)
-
-# load graph
-G = nx.Graph()
-for line in open(fn1):
-    from_node, to_node = map(int, line.rstrip().split("\t"))
-    if from_node not in G or to_node not in G[from_node]:
-        G.add_edge(from_node,to_node)
-
-# load the ground-truth partition
-groundtruth_partition = dict()
-for line in open(fn2):
-    node, cluster = map(int, line.rstrip().split("\t"))
-    if node not in G.nodes(): continue 
-    groundtruth_partition[node] = cluster
-
-# print some general info
-gt_mu = community_ext.estimate_mu(G,groundtruth_partition)
-print("ground truth mu\t",gt_mu)
-print("ground truth clusters\t",len(set(groundtruth_partition.values())))
-print("ground truth modularity\t", community_ext.modularity(groundtruth_partition,G))
+    # the partition with the optimal parameter value
+    partition, status, loglike = results[res.x]
+    return partition, status, loglike, best_par
 
-# now cycle thru the methods and optimize with each one
-methods = ('ppm','dcppm','ilfrs','ilfr')
 
-for method in methods:
-    print('\nMethod', method)
+# the optimization with one method, the lines to print are returned so that
+# the output of the methods does not interleave
+def run_method(method):
+    G, groundtruth_partition = worker_data()
+    lines = ['\nMethod %s' % method]
     # a starting parameter value depends on the method
     if method in ('ilfrs','ilfr'):
         work_par = 0.5
     else:
         work_par = 1.
 
-    partition, loglike, best_par = opt_par(G,method,work_par)
-    # calculate and print the scores of resulting partition
+    partition, status, loglike, best_par = opt_par(G,method,work_par)
+    # calculate the scores of resulting partition
     part_scores = community_ext.compare_partitions(groundtruth_partition,partition)
-    print('best par',best_par)
-    print("rand\t% 0f\tjaccard\t% 0f\tnmi\t% 0f\tnmi_arithm\t% 0f\tsize\t%d\tloglike\t% 0f" %\
-            (part_scores['rand'], part_scores['jaccard'], part_scores['nmi'], part_scores['nmi_arithm'], len(set(partition.values())), loglike))
+    lines.append('best par %s' % best_par)
+    lines.append("rand\t% 0f\tjaccard\t% 0f\tnmi\t% 0f\tnmi_arithm\t% 0f\tsize\t%d\tloglike\t% 0f" %\
+            (part_scores['rand'], part_scores['jaccard'], part_scores['nmi'], part_scores['nmi_arithm'], status.num_communities, loglike))
+    return lines
+
+
+if __name__ == '__main__':
+    fn1 = "datasets/polblogs/polblogs.edges"
+    fn2 = fn1.replace(".edges",".clusters")
+    print("DATASET:",fn1)
+
+    # load graph and the ground-truth partition
+    G, groundtruth_partition = load_edges_and_clusters(fn1, fn2)
+
+    # print some general info
+    gt_mu = community_ext.estimate_mu(G,groundtruth_partition)
+    print("ground truth mu\t",gt_mu)
+    print("ground truth clusters\t",len(set(groundtruth_partition.values())))
+    print("ground truth modularity\t", community_ext.modularity(groundtruth_partition,G))
+
+    # now optimize with each method, the methods are independent so they
+    # run in parallel processes; the results are printed in the methods order
+    methods = ('ppm','dcppm','ilfrs','ilfr')
+
+    run_methods(run_method, methods, G, groundtruth_partition)
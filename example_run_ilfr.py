@@ -2,32 +2,22 @@
 #!/usr/bin/env python
 
 from __future__ import print_function
+from collections import deque
 import community_ext
-import networkx as nx
-import scipy
+from example_utils import load_edges_and_clusters
+from scipy.optimize import minimize_scalar
 
-def opt_mu(G,partition,mu):
-    opt_fn = lambda x:-community_ext.ilfr_mu_loglikelihood(G,partition,current_mu=x[0],model='ilfr')
-    return float(scipy.optimize.fmin_powell(opt_fn, mu,full_output = False,disp = False))
+def opt_mu(G,partition):
+    opt_fn = lambda x:-community_ext.ilfr_mu_loglikelihood(G,partition,current_mu=x,model='ilfr')
+    return float(minimize_scalar(opt_fn, bounds=(0., 1.), method='bounded', options={'xatol': 1e-4}).x)
 
 
 fn1 = "datasets/polblogs/polblogs.edges"
 fn2 = fn1.replace(".edges",".clusters")
 print("DATASET:",fn1)
 
-# load graph
-G = nx.Graph()
-for line in open(fn1):
-    from_node, to_node = map(int, line.rstrip().split("\t"))
-    if from_node not in G or to_node not in G[from_node]:
-        G.add_edge(from_node,to_node)
-
-# load the ground-truth partition
-groundtruth_partition = dict()
-for line in open(fn2):
-    node, cluster = map(int, line.rstrip().split("\t"))
-    if node not in G.nodes(): continue 
-    groundtruth_partition[node] = cluster
+# load graph and the ground-truth partition
+G, groundtruth_partition = load_edges_and_clusters(fn1, fn2)
 
 # print some general info
 gt_mu = community_ext.estimate_mu(G,groundtruth_partition)
@@ -43,28 +33,32 @@ work_par = 0.5
 
 # now start the iterative process    
 prev_par, it = -1, 0
-prev_pars = set()
+prev_pars = deque(maxlen=8) # the last parameter values
+prev_partition = None
 while abs(work_par-prev_par)>1e-5: # stop if the size of improvement too small
     it += 1
     if it>100: break # stop after 100th iteration
 
     # update the parameter value
     prev_par = work_par
-    if prev_par in prev_pars: break # stop if we are in the cycle
-    prev_pars.add(prev_par)
+    if any(abs(prev_par-p)<1e-4 for p in prev_pars): break # stop if we are in the cycle
+    prev_pars.append(prev_par)
 
     # find the optimal partition with the current parameter value
-    partition = community_ext.best_partition(G,model=method,pars={'mu':work_par})
+    partition, status = community_ext.best_partition(G,model=method,pars={'mu':work_par},return_status=True)
+
+    if partition == prev_partition: break # stop if the partition did not change
+    prev_partition = partition
 
     # calculate optimal parameter value for the current partition
-    work_par = opt_mu(G,partition,community_ext.estimate_mu(G,partition))
+    work_par = opt_mu(G,partition)
 
-    loglike =   community_ext.model_log_likelihood(G,partition,model=method,pars={'gamma':work_par,'mu':work_par})
+    loglike =   community_ext.model_log_likelihood_from_status(status,model=method,pars={'gamma':work_par,'mu':work_par})
     print('current par',work_par,'loglike',loglike)
 
 # calculate and print the scores of resulting partition
 part_scores = community_ext.compare_partitions(groundtruth_partition,partition)
-loglike =   community_ext.model_log_likelihood(G,partition,model=method,pars={'gamma':work_par,'mu':work_par})
+loglike =   community_ext.model_log_likelihood_from_status(status,model=method,pars={'gamma':work_par,'mu':work_par})
 print('best par',work_par)
 print("rand\t% 0f\tjaccard\t% 0f\tnmi\t% 0f\tnmi_arithm\t% 0f\tsize\t%d\tloglike\t% 0f" %\
-        (part_scores['rand'], part_scores['jaccard'], part_scores['nmi'], part_scores['nmi_arithm'], len(set(partition.values())), loglike))
+        (part_scores['rand'], part_scores['jaccard'], part_scores['nmi'], part_scores['nmi_arithm'], status.num_communities, loglike))
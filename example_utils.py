@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+#!/usr/bin/env python
+
+"""
+Helpers shared by the example scripts
+"""
+
+from __future__ import print_function
+from concurrent.futures import ProcessPoolExecutor
+
+import networkx as nx
+import numpy as np
+
+# the graph and the ground-truth partition, set once in every worker process
+# by init_worker instead of being pickled with each task
+_worker_data = None, None
+
+
+def load_edges_and_clusters(fn1, fn2):
+    """Load a graph and its ground-truth partition
+
+    Parameters
+    ----------
+    fn1 : str
+        path to a tab separated file with one edge (two integer nodes) per line
+    fn2 : str
+        path to a tab separated file with a node and its cluster per line
+
+    Returns
+    -------
+    G : networkx.Graph
+        the graph, repeated edges are added once
+    groundtruth_partition : dict
+        the clusters of the nodes of G, nodes missing in G are skipped
+    """
+    edges = np.loadtxt(fn1, dtype=np.int64, delimiter='\t', ndmin=2)
+    # keep the first occurrence of every undirected edge, in the file order
+    __, first = np.unique(np.sort(edges, axis=1), axis=0, return_index=True)
+    G = nx.Graph()
+    G.add_edges_from(edges[np.sort(first)].tolist())
+
+    clusters = np.loadtxt(fn2, dtype=np.int64, delimiter='\t', ndmin=2)
+    nodes = set(G)
+    groundtruth_partition = {node: cluster
+                             for node, cluster in clusters.tolist()
+                             if node in nodes}
+    return G, groundtruth_partition
+
+
+def init_worker(G, groundtruth_partition):
+    """Keep the graph and the ground-truth partition in a worker process"""
+    global _worker_data
+    _worker_data = G, groundtruth_partition
+
+
+def worker_data():
+    """The graph and the ground-truth partition of the worker process"""
+    return _worker_data
+
+
+def run_methods(run_method, methods, G, groundtruth_partition):
+    """Run the independent optimizations of the methods in parallel processes
+
+    Parameters
+    ----------
+    run_method : callable
+        a module level function taking a method name and returning the lines
+        to print, it gets the graph and the partition from worker_data
+    methods : sequence of str
+        the methods to run, one process each
+    G : networkx.Graph
+        the graph
+    groundtruth_partition : dict
+        the ground-truth partition of G
+
+    The lines of the methods are printed in the methods order.
+    """
+    with ProcessPoolExecutor(max_workers=len(methods), initializer=init_worker,
+                             initargs=(G, groundtruth_partition)) as executor:
+        for lines in executor.map(run_method, methods):
+            print('\n'.join(lines))
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+import networkx as nx
+
+import community_ext
+
+
+def test_partition_init_unsorted_insertion_order():
+    # the nodes are not inserted in sorted order, the starting partition
+    # must still follow the node labels
+    graph = nx.Graph()
+    graph.add_edges_from([('g', 'e'), ('f', 'g'), ('e', 'f'), ('d', 'e'),
+                          ('d', 'b'), ('c', 'd'), ('b', 'c')])
+    graph.add_node('a')
+    part_init = {'a': 5, 'b': 5, 'c': 5, 'd': 7, 'e': 7, 'f': 7, 'g': 7}
+    for model in ('ppm', 'dcppm', 'ilfr'):
+        partition = community_ext.best_partition(graph, model=model,
+                                                 partition=part_init)
+        assert partition['a'] == partition['b'] == partition['c']
+        assert partition['c'] == partition['d']
+        assert partition['e'] == partition['f'] == partition['g']
+        assert partition['d'] != partition['e']
+
+
+def test_weights_changed_in_place():
+    # networkx keeps its cache when a weight is changed in place, the
+    # partition and the likelihood must still follow the new weights
+    graph = nx.Graph()
+    graph.add_weighted_edges_from([(0, 1, 5), (1, 2, 5), (0, 2, 5), (2, 3, 1),
+                                   (3, 4, 5), (4, 5, 5), (3, 5, 5)])
+    pars = {'gamma': 1.}
+    partition = community_ext.best_partition(graph, model='ppm', pars=pars)
+    graph[2][3]['weight'] = 20
+    graph[0][1]['weight'] = 0.1
+    graph[4][5]['weight'] = 0.1
+    fresh = nx.Graph(graph)
+    assert (community_ext.best_partition(graph, model='ppm', pars=pars) ==
+            community_ext.best_partition(fresh, model='ppm', pars=pars))
+    assert (community_ext.model_log_likelihood(graph, partition, 'ppm',
+                                               pars=pars) ==
+            community_ext.model_log_likelihood(fresh, partition, 'ppm',
+                                               pars=pars))
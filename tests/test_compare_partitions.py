@@ -0,0 +1,29 @@
+# -*- coding: utf-8 -*-
+import random
+
+import numpy as np
+
+import community_ext
+
+
+def test_arrays_match_dicts():
+    # the community arrays of the nodes in the same order must give the
+    # same metrics as the partition dicts, whatever the community labels
+    rng = random.Random(7)
+    nodes = ['n%d' % node for node in range(200)]
+    labels = [3, 'a', (1, 2), frozenset([4]), None]
+    for _ in range(10):
+        p1 = dict((node, rng.choice(labels)) for node in nodes)
+        p2 = dict((node, rng.randrange(6)) for node in nodes)
+        from_dicts = community_ext.compare_partitions(p1, p2)
+        # the array of p1 numbers its communities by first appearance
+        com2idx = {}
+        array1 = np.array([com2idx.setdefault(p1[node], len(com2idx))
+                           for node in nodes])
+        array2 = np.array([p2[node] for node in nodes])
+        from_arrays = community_ext.compare_partitions(array1, array2)
+        assert sorted(from_dicts) == sorted(from_arrays)
+        for key in from_dicts:
+            assert np.isclose(from_dicts[key], from_arrays[key])
+    same = community_ext.compare_partitions(array1, array1)
+    assert np.isclose(same['nmi'], 1.) and np.isclose(same['rand'], 1.)
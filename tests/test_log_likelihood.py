@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+import random
+
+import networkx as nx
+import numpy as np
+
+import community_ext
+from community_ext.community_ext import __modularity as fast_modularity
+from community_ext.community_status import Status
+
+PARS = {'gamma': 0.8, 'mu': 0.3}
+
+
+def test_model_log_likelihood_delta():
+    # the delta of a move must match the difference of the fast log
+    # likelihoods of the statuses before and after it
+    graph = nx.les_miserables_graph()
+    graph.add_edge('Valjean', 'Valjean', weight=3)
+    rng = random.Random(42)
+    nodes = sorted(graph.nodes())
+    partition = dict((node, rng.randrange(8)) for node in nodes)
+    for model in ('ppm', 'dcppm', 'ilfr', 'ilfrs'):
+        for _ in range(50):
+            node, other = rng.sample(nodes, 2)
+            status = Status()
+            status.init(graph, 'weight', partition)
+            new_com = status.node2com[status.node2idx[other]]
+            delta = community_ext.model_log_likelihood_delta(
+                status, node, new_com, model, pars=PARS)
+            moved = dict(partition)
+            moved[node] = partition[other]
+            moved_status = Status()
+            moved_status.init(graph, 'weight', moved)
+            expected = (fast_modularity(moved_status, model=model, pars=PARS)
+                        - fast_modularity(status, model=model, pars=PARS))
+            assert np.isclose(delta, expected, rtol=0., atol=1e-10)
+
+
+def test_from_status_matches_graph_functions():
+    # the status returned by best_partition must give the same values as
+    # the functions working on the graph and the returned partition
+    graph = nx.les_miserables_graph()
+    for model in ('ppm', 'dcppm', 'ilfr', 'ilfrs'):
+        partition, status = community_ext.best_partition(
+            graph, model=model, pars=PARS, return_status=True)
+        assert status.partition == partition
+        for other in ('ppm', 'dcppm', 'ilfr', 'ilfrs'):
+            assert np.isclose(
+                community_ext.model_log_likelihood_from_status(
+                    status, other, pars=PARS),
+                community_ext.model_log_likelihood(graph, partition, other,
+                                                   pars=PARS))
+        for other in ('ppm', 'dcppm'):
+            assert np.isclose(
+                community_ext.estimate_gamma_from_status(status, model=other),
+                community_ext.estimate_gamma(graph, partition, model=other))
+    # estimate_mu counts the links, the status their weight
+    graph = nx.Graph(graph.edges())
+    for model in ('ilfr', 'ilfrs'):
+        partition, status = community_ext.best_partition(
+            graph, model=model, pars=PARS, return_status=True)
+        assert np.isclose(community_ext.estimate_mu_from_status(status),
+                          community_ext.estimate_mu(graph, partition))